@@ -0,0 +1,76 @@
+"""
+Checks that assisted (speculative) decoding reproduces Gemma's greedy output
+and reports its speedup and draft-token acceptance rate.
+
+Run from the project root:
+    python -m benchmarks.bench_assisted --assistant <draft-model-id> [--num-prompts 5]
+"""
+import argparse
+import time
+
+from config import (
+    GEMMA_BASE_MODEL_ID,
+    GEMMA_ADAPTER_PATH,
+    GEMMA_MERGED_MODEL_PATH,
+    GEMMA_ASSISTANT_MODEL_ID,
+    GEMMA_ASSISTANT_NUM_TOKENS,
+)
+from reply_generator import EmailGenerator
+
+PROMPTS = [
+    ("Merger Announcement", '{"status": "SUCCESS", "ticket_id": "#T-MERGER-7391", '
+                            '"message": "Verification complete. Ticket raised for Senior Manager approval."}'),
+    ("Sustainability Initiative", '{"rag_summary": "According to our Q3 report, carbon emissions were reduced by 15%, '
+                                  'and our renewable energy portfolio grew to 45%."}'),
+    ("Other", '{"message": "Query has been forwarded to the appropriate department for handling."}'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default=GEMMA_BASE_MODEL_ID)
+    parser.add_argument("--adapter", default=GEMMA_ADAPTER_PATH)
+    parser.add_argument("--merged", default=GEMMA_MERGED_MODEL_PATH)
+    parser.add_argument("--assistant", default=GEMMA_ASSISTANT_MODEL_ID, required=GEMMA_ASSISTANT_MODEL_ID is None)
+    parser.add_argument("--num-assistant-tokens", type=int, default=GEMMA_ASSISTANT_NUM_TOKENS)
+    parser.add_argument("--num-prompts", type=int, default=len(PROMPTS))
+    args = parser.parse_args()
+
+    generator = EmailGenerator(
+        args.base, args.adapter, merged_model_path=args.merged,
+        assistant_model_id=args.assistant, num_assistant_tokens=args.num_assistant_tokens
+    )
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.num_prompts)]
+
+    # Warm up both paths
+    generator._generate_tokens(*prompts[0], do_sample=False, assisted=False)
+    generator._generate_tokens(*prompts[0], do_sample=False, assisted=True)
+    generator._assisted_totals.update(calls=0, new_tokens=0, target_passes=0, draft_tokens=0)
+
+    plain_seconds = assisted_seconds = 0.0
+    plain_tokens = mismatches = 0
+    for intent, details in prompts:
+        start = time.perf_counter()
+        plain = generator._generate_tokens(intent, details, do_sample=False, assisted=False)
+        plain_seconds += time.perf_counter() - start
+        plain_tokens += len(plain)
+
+        start = time.perf_counter()
+        assisted = generator._generate_tokens(intent, details, do_sample=False, assisted=True)
+        assisted_seconds += time.perf_counter() - start
+
+        mismatches += plain.tolist() != assisted.tolist()
+
+    stats = generator.assisted_stats()
+    print(f"Prompts: {len(prompts)} | draft tokens per step: {args.num_assistant_tokens}")
+    print(f"greedy   : {plain_tokens / plain_seconds:8.2f} tokens/sec")
+    print(f"assisted : {stats['new_tokens'] / assisted_seconds:8.2f} tokens/sec")
+    print(f"Speedup  : {plain_seconds / assisted_seconds:.2f}x")
+    print(f"Acceptance rate: {stats['acceptance_rate']:.1%} "
+          f"({stats['accepted_tokens']}/{stats['draft_tokens']} drafted tokens, "
+          f"{stats['tokens_per_target_pass']:.2f} tokens per Gemma pass)")
+    print(f"Outputs differing from greedy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
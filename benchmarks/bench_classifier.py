@@ -0,0 +1,76 @@
+"""
+Compares IntentClassifier.predict (one forward pass per email) against
+IntentClassifier.predict_batch (length-bucketed batches) on CPU.
+
+Run from the project root:
+    python -m benchmarks.bench_classifier --num-texts 256 --batch-size 32 [--backend int8]
+"""
+import argparse
+import random
+import resource
+import time
+
+from config import BERT_MODEL
+from intent_classify import BACKENDS, IntentClassifier
+
+SAMPLE_TEXTS = [
+    "Can you send over the latest financial performance report for Q3?",
+    "We are excited to announce our upcoming merger with Tech Solutions Inc.",
+    "Please share the carbon emission numbers from the sustainability report.",
+    "Hi team, reminder that the office will be closed on Friday for maintenance. "
+    "Please make sure all laptops are taken home and desks are cleared before you leave.",
+    "Following up on the vendor contract renewal discussed last week. Legal has asked "
+    "for a revised indemnity clause and a copy of the updated insurance certificate "
+    "before they can approve the final draft. Could you coordinate with procurement?",
+]
+
+
+def make_texts(num_texts: int, seed: int = 0) -> list:
+    """Builds a reproducible mix of short and long emails."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(num_texts):
+        # Repeat sentences so token lengths vary across the 128-token range
+        parts = rng.choices(SAMPLE_TEXTS, k=rng.randint(1, 4))
+        texts.append(" ".join(parts))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=BERT_MODEL, help="Path or Hub ID of the classifier")
+    parser.add_argument("--backend", default="eager", choices=BACKENDS)
+    parser.add_argument("--num-texts", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    # Force CPU so the numbers are comparable across machines
+    classifier = IntentClassifier(model_path=args.model, backend=args.backend, device="cpu")
+    print(f"Backend: {classifier.backend}")
+
+    texts = make_texts(args.num_texts)
+
+    # Warm up both paths so lazy initialisation is not timed
+    classifier.predict(texts[0])
+    classifier.predict_batch(texts[:args.batch_size], batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    single = [classifier.predict(text) for text in texts]
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = classifier.predict_batch(texts, batch_size=args.batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = sum(a["label"] != b["label"] for a, b in zip(single, batched))
+
+    print(f"Texts: {len(texts)} | batch_size: {args.batch_size}")
+    print(f"predict       : {len(texts) / single_seconds:8.1f} texts/sec ({single_seconds:.2f}s)")
+    print(f"predict_batch : {len(texts) / batch_seconds:8.1f} texts/sec ({batch_seconds:.2f}s)")
+    print(f"Speedup       : {single_seconds / batch_seconds:.2f}x")
+    print(f"Peak RSS      : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    print(f"Label mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Reports load time, peak memory and decoding speed of EmailGenerator for each
+CPU mode (fp32 / bf16 / int8). Every mode runs in a fresh subprocess so the
+memory numbers do not include models loaded by a previous mode.
+
+Run from the project root (after `python merge_adapters.py` to include the merged checkpoint):
+    python -m benchmarks.bench_generator_modes --new-tokens 64
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from config import GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH, GEMMA_MERGED_MODEL_PATH
+
+MODES = ("fp32", "bf16", "int8")
+
+
+def run_mode(args):
+    """Child process: load one mode, decode a fixed number of tokens and print JSON."""
+    import torch
+    from reply_generator import EmailGenerator
+
+    generator = EmailGenerator(
+        args.base, args.adapter,
+        merged_model_path=None if args.no_merged else args.merged,
+        cpu_mode=args.mode
+    )
+    prompt = generator._build_prompt("Merger Announcement", '{"status": "SUCCESS", "ticket_id": "#T-MERGER-7391"}')
+    inputs = generator.tokenizer(prompt, return_tensors="pt").to(generator.device)
+
+    # Greedy with a fixed length so every mode decodes exactly the same number of tokens
+    with torch.no_grad():
+        generator.model.generate(**inputs, max_new_tokens=4, min_new_tokens=4, do_sample=False)
+        start = time.perf_counter()
+        generator.model.generate(**inputs, max_new_tokens=args.new_tokens, min_new_tokens=args.new_tokens, do_sample=False)
+        decode_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": args.mode,
+        "load_seconds": round(generator.load_seconds, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "tokens_per_second": round(args.new_tokens / decode_seconds, 2),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default=GEMMA_BASE_MODEL_ID)
+    parser.add_argument("--adapter", default=GEMMA_ADAPTER_PATH)
+    parser.add_argument("--merged", default=GEMMA_MERGED_MODEL_PATH)
+    parser.add_argument("--no-merged", action="store_true", help="Load base + adapters instead of the merged checkpoint")
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)  # Set for the child processes
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    print(f"{'mode':<6} {'load (s)':>9} {'peak RSS (MB)':>14} {'tokens/sec':>11}")
+    for mode in args.modes:
+        command = [sys.executable, "-m", "benchmarks.bench_generator_modes", "--mode", mode,
+                   "--base", args.base, "--adapter", args.adapter, "--merged", args.merged,
+                   "--new-tokens", str(args.new_tokens)]
+        if args.no_merged:
+            command.append("--no-merged")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<6} {result['load_seconds']:>9.2f} {result['peak_rss_mb']:>14.1f} {result['tokens_per_second']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures how generation throughput scales with the number of GeneratorPool workers.
+
+Each worker count starts a fresh pool, sends it the same requests at once and reports
+emails/sec and the speedup over one worker. Use --tiny to run without the real
+checkpoints (random tiny models built by benchmarks.tiny_models).
+
+Run from the project root:
+    python -m benchmarks.bench_generator_pool --workers 1,2,4,8 --num-requests 32
+"""
+import argparse
+import os
+import time
+
+from config import GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH, GEMMA_MERGED_MODEL_PATH, GEMMA_CPU_MODE
+from generator_pool import GeneratorPool
+from benchmarks.bench_assisted import PROMPTS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--num-requests", type=int, default=16)
+    parser.add_argument("--separate-weights", action="store_true", help="Load weights in every worker")
+    parser.add_argument("--tiny", action="store_true", help="Use tiny random models instead of Gemma")
+    args = parser.parse_args()
+
+    if args.tiny:
+        from benchmarks.tiny_models import build_tiny_models
+        paths = build_tiny_models(".bench_models")
+        generator_kwargs = dict(base_model_id=paths["gemma"], adapter_path=paths["adapter"])
+    else:
+        generator_kwargs = dict(base_model_id=GEMMA_BASE_MODEL_ID, adapter_path=GEMMA_ADAPTER_PATH,
+                                merged_model_path=GEMMA_MERGED_MODEL_PATH, cpu_mode=GEMMA_CPU_MODE)
+
+    requests = [PROMPTS[i % len(PROMPTS)] for i in range(args.num_requests)]
+    print(f"CPUs available: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+
+    baseline = None
+    for num_workers in (int(n) for n in args.workers.split(",")):
+        pool = GeneratorPool(num_workers=num_workers, threads_per_worker=args.threads_per_worker,
+                             share_weights=not args.separate_weights, **generator_kwargs)
+        pool.generate(*requests[0])  # Warm up every code path once
+
+        start = time.perf_counter()
+        pool.generate_batch(requests)
+        elapsed = time.perf_counter() - start
+        pool.close()
+
+        throughput = len(requests) / elapsed
+        baseline = baseline or throughput
+        print(f"workers={num_workers:<3} {throughput:.2f} emails/sec  speedup x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares one-request-per-message fetching against get_unread_emails'
+batched fetching, using FakeGmailService with simulated latency.
+
+Run from the project root:
+    python -m benchmarks.bench_gmail_fetch --num-messages 200 --latency 0.05
+"""
+import argparse
+import time
+
+from fake_gmail import FakeGmailService, make_message
+from recieve_mail import get_unread_emails, parse_message
+
+
+def fetch_sequential(service, start_timestamp):
+    """The pre-batching behaviour: one messages().get round trip per message."""
+    result = service.users().messages().list(
+        userId='me', q=f"is:unread in:inbox after:{start_timestamp}"
+    ).execute()
+    return [
+        parse_message(service.users().messages().get(userId='me', id=msg['id'], format='full').execute())
+        for msg in result.get('messages', [])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-messages", type=int, default=100, help="Must fit in one list page (<= 100)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip")
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    start_timestamp = int(time.time()) - 60
+    messages = [
+        make_message(f"msg-{i}", f"Sender {i} <sender{i}@example.com>", f"Subject {i}",
+                     f"Body of message {i}.", internal_date=start_timestamp + 1 + i)
+        for i in range(args.num_messages)
+    ]
+
+    service = FakeGmailService(messages, latency=args.latency)
+    start = time.perf_counter()
+    sequential = fetch_sequential(service, start_timestamp)
+    sequential_seconds = time.perf_counter() - start
+    sequential_trips = service.round_trips
+
+    service = FakeGmailService(messages, latency=args.latency, failure_rate=args.failure_rate)
+    start = time.perf_counter()
+    batched = get_unread_emails(service, start_timestamp, chunk_size=args.chunk_size)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"Messages: {args.num_messages} | latency: {args.latency * 1000:.0f} ms | chunk size: {args.chunk_size}")
+    print(f"sequential : {sequential_seconds:6.2f}s, {sequential_trips} round trips, {len(sequential)} fetched")
+    print(f"batched    : {batch_seconds:6.2f}s, {service.round_trips} round trips, {len(batched)} fetched")
+    print(f"Speedup    : {sequential_seconds / batch_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
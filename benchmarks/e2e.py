@@ -0,0 +1,227 @@
+"""
+Offline end-to-end benchmark: replays a mailbox through
+get_unread_emails -> run_workflow -> send_email (+ batched read-marking) against FakeGmailService.
+
+The mailbox is either a JSONL file (one {"id", "from", "subject", "body"} object per
+line) or a synthetic one. With --models tiny, randomly initialized DistilBERT/Gemma
+models are built locally, so the whole run needs no network and no GPU.
+
+Reports p50/p95/p99 latency per stage, emails/sec and peak RSS, and writes them as
+JSON. Pass --baseline with an earlier result file to see the relative change.
+
+    python -m benchmarks.e2e --synthetic 200 --models tiny --output bench_e2e.json
+    python -m benchmarks.e2e --mailbox mailbox.jsonl --models tiny --baseline bench_e2e.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import time
+
+from fake_gmail import FakeGmailService, make_message
+
+SYNTHETIC_TEMPLATES = [
+    ("Merger update", "We are excited to announce our upcoming merger with {company}. "
+                      "Please confirm the verification status and raise the approval ticket."),
+    ("Sustainability figures", "Could you share the latest carbon emission numbers and the renewable "
+                               "energy share from the {quarter} sustainability report?"),
+    ("Office closure", "Hi team, reminder that the {city} office will be closed on Friday for maintenance. "
+                       "Please take your laptops home."),
+    ("Vendor contract", "Following up on the {company} contract renewal. Legal has asked for a revised "
+                        "indemnity clause before approving the final draft."),
+]
+COMPANIES = ["Tech Solutions Inc.", "Innovate Corp", "Globex", "Initech"]
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+CITIES = ["London", "Pune", "Austin", "Berlin"]
+
+
+def synthetic_mailbox(count, seed=0):
+    """Yields reproducible mailbox records mixing all intents."""
+    rng = random.Random(seed)
+    for i in range(count):
+        subject, body = rng.choice(SYNTHETIC_TEMPLATES)
+        body = body.format(company=rng.choice(COMPANIES), quarter=rng.choice(QUARTERS), city=rng.choice(CITIES))
+        yield {"id": f"synthetic-{i}", "from": f"Sender {i} <sender{i}@example.com>", "subject": subject, "body": body}
+
+
+def read_mailbox(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def percentiles(samples):
+    """Nearest-rank p50/p95/p99 in milliseconds."""
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {"count": len(ordered), "p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99)}
+
+
+class _Timed:
+    """Wraps a model object and records how long each call to `method` takes."""
+
+    def __init__(self, target, method, samples):
+        self._target = target
+        self._method = method
+        self._samples = samples
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name != self._method:
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self._samples.append(time.perf_counter() - start)
+        return timed
+
+
+def load_models(kind, records, tiny_dir):
+    import main_graph
+
+    if kind == "real":
+        main_graph.warmup()
+        return main_graph.get_classifier(), main_graph.get_generator()
+
+    from benchmarks.tiny_models import build_tiny_models
+    from intent_classify import IntentClassifier
+    from reply_generator import EmailGenerator
+
+    paths = build_tiny_models(tiny_dir, corpus=[record["body"] for record in records[:1000]])
+    return IntentClassifier(paths["bert"], device="cpu"), EmailGenerator(paths["gemma"], paths["adapter"])
+
+
+def run(args):
+    import main_graph
+    from read_marker import ReadMarker
+    from recieve_mail import get_unread_emails, send_email
+
+    records = list(read_mailbox(args.mailbox) if args.mailbox else synthetic_mailbox(args.synthetic, args.seed))
+    classifier, generator = load_models(args.models, records, args.tiny_dir)
+
+    stages = {name: [] for name in ("fetch", "classify", "generate", "workflow", "send", "end_to_end")}
+    main_graph.set_models(_Timed(classifier, "predict", stages["classify"]),
+                          _Timed(generator, "generate", stages["generate"]))
+    if not args.reply_cache:
+        main_graph.reply_cache = None
+    if not args.templates:
+        main_graph.reply_templates = None
+
+    service = FakeGmailService(latency=args.gmail_latency)
+    read_marker = ReadMarker(lambda: service)
+    start_timestamp = int(time.time()) - 1
+    processed = 0
+    run_start = time.perf_counter()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for offset in range(0, len(records), args.arrivals_per_cycle):
+            # Deliver the next burst of mail, then run one polling cycle over it
+            arrived = time.perf_counter()
+            for record in records[offset:offset + args.arrivals_per_cycle]:
+                service.add_message(make_message(record["id"], record["from"], record["subject"], record["body"],
+                                                 internal_date=start_timestamp + 1))
+
+            start = time.perf_counter()
+            emails = get_unread_emails(service, start_timestamp)
+            stages["fetch"].append(time.perf_counter() - start)
+
+            for email in emails:
+                start = time.perf_counter()
+                reply = main_graph.run_workflow(email["content"].strip(), email["sender_email"], email["subject"])
+                stages["workflow"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                send_email(service, email["sender_email"], reply["reply_subject"], reply["reply_body"])
+                read_marker.add(email["id"])
+                end = time.perf_counter()
+                stages["send"].append(end - start)
+                stages["end_to_end"].append(end - arrived)
+                processed += 1
+            # The next cycle lists unread mail again, so answered mail must be read by then
+            read_marker.flush()
+        read_marker.close()
+
+    assert processed == len(records), f"processed {processed} emails from a mailbox of {len(records)}"
+
+    elapsed = time.perf_counter() - run_start
+    return {
+        "config": {
+            "mailbox": args.mailbox or f"synthetic:{args.synthetic}",
+            "models": args.models,
+            "gmail_latency_s": args.gmail_latency,
+            "arrivals_per_cycle": args.arrivals_per_cycle,
+            "reply_cache": args.reply_cache,
+            "templates": args.templates,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "emails": processed,
+        "seconds": elapsed,
+        "emails_per_sec": processed / elapsed if elapsed else 0.0,
+        "gmail_round_trips": service.round_trips,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": {name: percentiles(samples) for name, samples in stages.items()},
+    }
+
+
+def print_report(result, baseline=None):
+    def change(new, old):
+        if baseline is None or old in (None, 0) or new is None:
+            return ""
+        return f" ({(new - old) / old:+.1%})"
+
+    base_stages = (baseline or {}).get("stages", {})
+    print(f"Emails: {result['emails']} in {result['seconds']:.2f}s | "
+          f"{result['emails_per_sec']:.2f} emails/sec{change(result['emails_per_sec'], (baseline or {}).get('emails_per_sec'))}")
+    print(f"Peak RSS: {result['peak_rss_mb']:.0f} MB | Gmail round trips: {result['gmail_round_trips']}")
+    print(f"{'stage':<11} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in result["stages"].items():
+        if not stats["count"]:
+            continue
+        print(f"{name:<11} {stats['count']:>6} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}"
+              f"{change(stats['p95_ms'], base_stages.get(name, {}).get('p95_ms'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--mailbox", help="JSONL mailbox to replay")
+    source.add_argument("--synthetic", type=int, default=100, help="Number of synthetic emails (default)")
+    parser.add_argument("--models", choices=("tiny", "real"), default="tiny")
+    parser.add_argument("--tiny-dir", default=".bench_models", help="Where tiny models are built/reused")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="Simulated seconds per Gmail round trip")
+    parser.add_argument("--arrivals-per-cycle", type=int, default=10, help="Emails delivered before each poll")
+    parser.add_argument("--reply-cache", action="store_true", help="Keep near-duplicate draft reuse enabled")
+    parser.add_argument("--templates", action="store_true", help="Keep template replies enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
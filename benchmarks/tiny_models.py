@@ -0,0 +1,92 @@
+"""
+Builds tiny, randomly initialized DistilBERT / Gemma-architecture models (plus a LoRA
+adapter) entirely offline, so IntentClassifier and EmailGenerator can be exercised on
+a CPU with no network access. The weights are random: outputs are gibberish, but the
+code paths, tensor shapes and per-token costs have the same structure as the real models.
+
+    python -m benchmarks.tiny_models --output .bench_models
+"""
+import argparse
+import os
+
+SPECIAL_TOKENS = ["<pad>", "<eos>", "<bos>", "<unk>", "<start_of_turn>", "<end_of_turn>", "[CLS]", "[SEP]"]
+LABELS = ["Merger Announcement", "Sustainability Initiative", "General Inquiry"]
+
+
+def _train_tokenizer(corpus, vocab_size):
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(corpus, trainer=trainer)
+    return tokenizer
+
+
+def _save_tokenizer(tokenizer, path, **special):
+    from transformers import PreTrainedTokenizerFast
+
+    wrapped = PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", unk_token="<unk>", **special)
+    wrapped.add_special_tokens({"additional_special_tokens": ["<start_of_turn>", "<end_of_turn>"]})
+    wrapped.save_pretrained(path)
+    return wrapped
+
+
+def build_tiny_models(output_dir, corpus=(), vocab_size=2000, seed=0):
+    """
+    Creates <output_dir>/bert, <output_dir>/gemma and <output_dir>/adapter (skipped if present).
+
+    Returns:
+        dict: Paths usable as IntentClassifier(model_path=...) and EmailGenerator(base, adapter).
+    """
+    paths = {name: os.path.join(output_dir, name) for name in ("bert", "gemma", "adapter")}
+    if all(os.path.isdir(path) for path in paths.values()):
+        return paths
+
+    import torch
+    from peft import LoraConfig, get_peft_model
+    from transformers import (
+        DistilBertConfig,
+        DistilBertForSequenceClassification,
+        GemmaConfig,
+        GemmaForCausalLM,
+    )
+    from reply_generator import PROMPT_BODY, PROMPT_PREFIX
+
+    torch.manual_seed(seed)
+    corpus = list(corpus) + [PROMPT_PREFIX + PROMPT_BODY.format(intent=label, details="{}") for label in LABELS]
+    tokenizer = _train_tokenizer(corpus, vocab_size)
+    vocab = tokenizer.get_vocab_size()
+    token_id = tokenizer.token_to_id
+
+    _save_tokenizer(tokenizer, paths["bert"], cls_token="[CLS]", sep_token="[SEP]")
+    DistilBertForSequenceClassification(DistilBertConfig(
+        vocab_size=vocab, dim=64, hidden_dim=128, n_layers=2, n_heads=2,
+        num_labels=len(LABELS),
+        id2label=dict(enumerate(LABELS)),
+        label2id={label: i for i, label in enumerate(LABELS)},
+        pad_token_id=token_id("<pad>"),
+    )).save_pretrained(paths["bert"])
+
+    _save_tokenizer(tokenizer, paths["gemma"], bos_token="<bos>", eos_token="<eos>")
+    GemmaForCausalLM(GemmaConfig(
+        vocab_size=vocab, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=2, num_key_value_heads=1, head_dim=32,
+        pad_token_id=token_id("<pad>"), eos_token_id=token_id("<eos>"), bos_token_id=token_id("<bos>"),
+    )).save_pretrained(paths["gemma"])
+
+    base = GemmaForCausalLM.from_pretrained(paths["gemma"])
+    get_peft_model(base, LoraConfig(r=4, target_modules=["q_proj", "v_proj"])).save_pretrained(paths["adapter"])
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=".bench_models")
+    args = parser.parse_args()
+    print(build_tiny_models(args.output))
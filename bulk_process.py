@@ -0,0 +1,253 @@
+"""
+Offline bulk processing: classifies (and drafts replies for) an archive of emails
+without touching Gmail.
+
+The input is streamed record by record, so archives larger than memory work:
+
+- JSONL: one object per line, either {"id", "from", "subject", "body"} mailbox
+  records or {"request_id", "title", "body"} records like requests.jsonl.
+- mbox: a standard Unix mailbox file (.mbox), parsed one message at a time.
+
+Records are processed in batches. After each batch its results are appended to the
+output JSONL and a checkpoint (<output>.checkpoint) records how far the run got,
+including the byte position in the input; --resume seeks straight there, so an
+interrupted backfill neither repeats nor skips any record and does not re-read the
+part of the archive already done.
+
+    python bulk_process.py archive.mbox --output drafts.jsonl
+    python bulk_process.py requests.jsonl --output intents.jsonl --classify-only
+    python bulk_process.py archive.mbox --output drafts.jsonl --resume
+"""
+import argparse
+import email
+import email.policy
+import email.utils
+import itertools
+import json
+import os
+import time
+
+from mime_extract import clip, html_to_text, strip_quotes_and_signature
+
+BATCH_SIZE = 256            # Records read, classified and written together
+GENERATE_BATCH_SIZE = 8     # Prompts decoded together by Gemma
+BODY_MAX_CHARS = 16384      # Same body budget as the live service
+
+
+# --- Readers ---
+# Readers yield (record, position) pairs. A position is (byte offset, index) just past
+# the record; passing it back in continues the archive there without reading what
+# came before, which is how --resume skips straight to the checkpoint.
+def read_jsonl(path, max_chars=BODY_MAX_CHARS, position=(0, 0), skip=0):
+    """
+    Yields normalized email records from a JSONL file, one line at a time.
+
+    Reading starts at `position`; the next `skip` records are passed over without being parsed.
+    """
+    byte_offset, index = position
+    with open(path, "rb") as f:
+        f.seek(byte_offset)
+        for line in f:
+            byte_offset += len(line)
+            index += 1
+            if not line.strip():
+                continue
+            if skip:
+                skip -= 1
+                continue
+            record = json.loads(line)
+            yield {
+                "id": str(record.get("id") or record.get("request_id") or index - 1),
+                "sender_email": email.utils.parseaddr(record.get("from", ""))[1],
+                "subject": record.get("subject") or record.get("title", ""),
+                "content": clip(record.get("body") or record.get("content", ""), max_chars),
+            }, (byte_offset, index)
+
+
+def read_mbox(path, max_chars=BODY_MAX_CHARS, position=(0, 0), skip=0):
+    """
+    Yields normalized email records from an mbox file, parsing one message at a time.
+
+    Reading starts at `position`; the next `skip` messages are passed over without being parsed.
+    """
+    byte_offset, index = position
+    with open(path, "rb") as f:
+        f.seek(byte_offset)
+        lines = []
+        for line in f:
+            # Every message starts with a "From " line
+            if line.startswith(b"From ") and lines:
+                if skip:
+                    skip -= 1
+                else:
+                    yield _mbox_record(lines, index, max_chars), (byte_offset, index + 1)
+                lines = []
+                index += 1
+            if lines or line.startswith(b"From "):
+                lines.append(line)
+            byte_offset += len(line)
+        if lines and not skip:
+            yield _mbox_record(lines, index, max_chars), (byte_offset, index + 1)
+
+
+def _mbox_record(lines, index, max_chars):
+    # Drop the "From " separator and undo mboxrd ">From " quoting
+    raw = b"".join(line[1:] if line.startswith(b">From ") else line for line in lines[1:])
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+    part = message.get_body(preferencelist=("plain", "html"))
+    text = ""
+    if part is not None:
+        try:
+            text = part.get_content()
+        except (LookupError, UnicodeError):
+            text = ""  # Unknown or broken charset
+        if part.get_content_type() == "text/html":
+            text = html_to_text(text)
+        text = strip_quotes_and_signature(text) or text
+    return {
+        "id": str(message.get("Message-ID") or index),
+        "sender_email": email.utils.parseaddr(message.get("From", ""))[1],
+        "subject": message.get("Subject", ""),
+        "content": clip(text, max_chars),
+    }
+
+
+def read_records(path, input_format=None, position=(0, 0), skip=0):
+    if (input_format or ("mbox" if path.endswith(".mbox") else "jsonl")) == "mbox":
+        return read_mbox(path, position=position, skip=skip)
+    return read_jsonl(path, position=position, skip=skip)
+
+
+# --- Checkpoints ---
+def load_checkpoint(path):
+    """
+    Returns {"offset": records done, "output_bytes": valid output size,
+    "input_position": reader position after the last record done}, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, offset, output_bytes, input_position):
+    # Write-then-rename, so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"offset": offset, "output_bytes": output_bytes, "input_position": input_position}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# --- Processing ---
+def process_batch(records, classify_only=False, generate_batch_size=GENERATE_BATCH_SIZE):
+    """Classifies a batch (and drafts replies unless classify_only); returns one result per record."""
+    from main_graph import classify_emails, draft_replies
+
+    predictions = classify_emails([record["content"] for record in records], with_confidence=True)
+    results = [
+        {"id": record["id"], "intent": intent, "confidence": confidence}
+        for record, (intent, confidence) in zip(records, predictions)
+    ]
+    if not classify_only:
+        replies = draft_replies([
+            {
+                "email_content": record["content"],
+                "sender_email": record["sender_email"],
+                "subject": record["subject"],
+                "intent": intent,
+                "confidence": confidence,
+            }
+            for record, (intent, confidence) in zip(records, predictions)
+        ], batch_size=generate_batch_size)
+        for result, reply in zip(results, replies):
+            result.update(reply)
+    return results
+
+
+def run(input_path, output_path, input_format=None, batch_size=BATCH_SIZE,
+        generate_batch_size=GENERATE_BATCH_SIZE, classify_only=False, resume=False,
+        start=0, limit=None):
+    """
+    Processes the archive and appends results to `output_path`; returns a throughput summary.
+
+    With resume=True the run continues after the last checkpointed batch (output written
+    after that checkpoint is discarded first); otherwise the output is overwritten and
+    the run starts at record `start`.
+    """
+    checkpoint_path = f"{output_path}.checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    position, skip = (0, 0), start
+    if checkpoint is not None:
+        start = checkpoint["offset"]
+        print(f"Resuming after record {start}.")
+        # Checkpoints written before input positions were stored only know the record count
+        if checkpoint.get("input_position"):
+            position, skip = tuple(checkpoint["input_position"]), 0
+        else:
+            skip = start
+    else:
+        open(output_path, "w").close()  # A fresh run starts a fresh output
+
+    records = itertools.islice(read_records(input_path, input_format, position, skip), limit)
+    offset, processed = start, 0
+    started = time.perf_counter()
+
+    with open(output_path, "a") as output:
+        if checkpoint is not None:
+            output.truncate(checkpoint["output_bytes"])
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            batch_started = time.perf_counter()
+            results = process_batch([record for record, _ in batch], classify_only, generate_batch_size)
+            for result in results:
+                result["offset"] = offset
+                output.write(json.dumps(result) + "\n")
+                offset += 1
+            output.flush()
+            os.fsync(output.fileno())
+            save_checkpoint(checkpoint_path, offset, output.tell(), batch[-1][1])
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - started
+            print(f"{offset} records done | batch: {len(batch) / (time.perf_counter() - batch_started):.1f} rec/s"
+                  f" | overall: {processed / elapsed:.1f} rec/s")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "records": processed,
+        "next_offset": offset,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(processed / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or mbox archive")
+    parser.add_argument("--output", required=True, help="JSONL file the results are appended to")
+    parser.add_argument("--format", choices=["jsonl", "mbox"], help="Input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--generate-batch-size", type=int, default=GENERATE_BATCH_SIZE)
+    parser.add_argument("--classify-only", action="store_true", help="Only classify; draft no replies")
+    parser.add_argument("--resume", action="store_true", help="Continue from the output's checkpoint")
+    parser.add_argument("--start", type=int, default=0, help="Record offset to start at (without --resume)")
+    parser.add_argument("--limit", type=int, help="Process at most this many records")
+    args = parser.parse_args()
+
+    from main_graph import shutdown
+
+    try:
+        summary = run(args.input, args.output, input_format=args.format, batch_size=args.batch_size,
+                      generate_batch_size=args.generate_batch_size, classify_only=args.classify_only,
+                      resume=args.resume, start=args.start, limit=args.limit)
+    finally:
+        shutdown()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+
+# Checkpointer options for compiling the graph
+CHECKPOINTER_KINDS = ("none", "memory", "sqlite")
+
+
+class _ThreadRetention:
+    """
+    Mixin that bounds how many graph threads a checkpointer keeps.
+
+    Every put/put_writes marks its thread as recently used. Threads idle for longer
+    than `ttl_seconds`, and the least recently used threads beyond `max_threads`,
+    are deleted. Eviction runs in batches (down to 90% of the limit) so its cost
+    is spread over many emails.
+    """
+    def _init_retention(self, max_threads: int, ttl_seconds: Optional[float], clock=time.monotonic):
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._last_used = OrderedDict()
+        self._retention_lock = threading.Lock()
+        self.evicted_threads = 0
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        now = self._clock()
+        with self._retention_lock:
+            self._last_used[thread_id] = now
+            self._last_used.move_to_end(thread_id)
+
+            expired = []
+            if self.ttl_seconds is not None:
+                for old_id, last_used in self._last_used.items():
+                    if now - last_used <= self.ttl_seconds:
+                        break
+                    expired.append(old_id)
+            if len(self._last_used) - len(expired) > self.max_threads:
+                keep = max(int(self.max_threads * 0.9), 1)
+                expired = list(self._last_used)[:len(self._last_used) - keep]
+            for old_id in expired:
+                del self._last_used[old_id]
+
+        if expired:
+            self._delete_threads(expired)
+            self.evicted_threads += len(expired)
+
+    def _delete_threads(self, thread_ids):
+        for thread_id in thread_ids:
+            self.delete_thread(thread_id)
+
+    def tracked_threads(self) -> int:
+        with self._retention_lock:
+            return len(self._last_used)
+
+
+class BoundedMemorySaver(_ThreadRetention, MemorySaver):
+    """An in-memory checkpointer whose size stays flat in a long-running service."""
+
+    def __init__(self, max_threads: int = 1000, ttl_seconds: Optional[float] = 3600, clock=time.monotonic, **kwargs):
+        MemorySaver.__init__(self, **kwargs)
+        self._init_retention(max_threads, ttl_seconds, clock)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        super().put_writes(config, writes, task_id, task_path)
+        self._touch(config)
+
+    def _delete_threads(self, thread_ids):
+        # One pass over writes/blobs for the whole batch instead of one pass per thread
+        doomed = set(thread_ids)
+        for thread_id in doomed:
+            self.storage.pop(thread_id, None)
+        for key in [key for key in list(self.writes) if key[0] in doomed]:
+            self.writes.pop(key, None)
+        for key in [key for key in list(self.blobs) if key[0] in doomed]:
+            self.blobs.pop(key, None)
+
+
+def make_checkpointer(kind: str = "memory", max_threads: int = 1000, ttl_seconds: Optional[float] = 3600,
+                      sqlite_path: str = "checkpoints.sqlite"):
+    """
+    Builds the checkpointer used to compile the graph.
+
+    Args:
+        kind (str): 'none' (no checkpoints), 'memory' (bounded in-memory) or
+            'sqlite' (bounded, on disk; needs langgraph-checkpoint-sqlite).
+        max_threads (int): Maximum number of email runs whose checkpoints are kept.
+        ttl_seconds (float, optional): Drop runs idle for longer than this (None = no TTL).
+        sqlite_path (str): Database file for the 'sqlite' option.
+    """
+    if kind not in CHECKPOINTER_KINDS:
+        raise ValueError(f"kind must be one of {CHECKPOINTER_KINDS}, got {kind!r}")
+
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return BoundedMemorySaver(max_threads=max_threads, ttl_seconds=ttl_seconds)
+
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        raise ImportError("The 'sqlite' checkpointer needs: pip install langgraph-checkpoint-sqlite")
+
+    class BoundedSqliteSaver(_ThreadRetention, SqliteSaver):
+        """A SQLite checkpointer that deletes old email runs so the file stays compact."""
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._touch(config)
+            return next_config
+
+        def put_writes(self, config, writes, task_id, task_path=""):
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(config)
+
+    conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    saver = BoundedSqliteSaver(conn)
+    saver._init_retention(max_threads, ttl_seconds)
+    return saver
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+
+class ClassificationCache:
+    """
+    Caches intent predictions keyed on a normalized content hash plus the model revision.
+
+    A bounded in-memory LRU answers repeated emails (newsletters, automated notices,
+    CC storms) without a forward pass. With `db_path` set, entries are also written to
+    a SQLite file so the cache survives restarts; entries evicted from memory are
+    still found there.
+    """
+    def __init__(self, model_revision: str, max_entries: int = 4096, db_path: Optional[str] = None):
+        """
+        Args:
+            model_revision (str): Identifies the model (e.g. config.BERT_MODEL and its commit);
+                predictions from other revisions are never returned.
+            max_entries (int): Maximum number of predictions kept in memory.
+            db_path (str, optional): SQLite file for persistent storage.
+        """
+        self.model_revision = model_revision
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key TEXT PRIMARY KEY, label TEXT NOT NULL, confidence REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def key(self, text: str) -> str:
+        """Hash of the normalized text, scoped to the model revision."""
+        # Whitespace differences never change the tokenization, so they should not miss the cache
+        normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+        return hashlib.sha256(f"{self.model_revision}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[dict]:
+        """Returns the cached prediction for `text`, or None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            prediction = self._entries.get(key)
+            if prediction is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT label, confidence FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    prediction = {"label": row[0], "confidence": row[1]}
+                    self._remember(key, prediction)
+
+            if prediction is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(prediction)
+
+    def put(self, text: str, prediction: dict) -> None:
+        """Stores a prediction for `text` in memory (and on disk when persistent)."""
+        key = self.key(text)
+        with self._lock:
+            self._remember(key, {"label": prediction["label"], "confidence": prediction["confidence"]})
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, label, confidence) VALUES (?, ?, ?)",
+                    (key, prediction["label"], prediction["confidence"])
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current in-memory size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, prediction: dict) -> None:
+        # Caller holds the lock
+        self._entries[key] = prediction
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -7,6 +7,26 @@ import os
 # This will be downloaded from the Hub
 BERT_MODEL = "darshandugar/MailClassifier-DistilBERT"
 
+# Inference backend for the classifier: "eager", "int8", "torchscript" or "onnx".
+# Non-eager backends are checked against the eager model on load and fall back to it on mismatch.
+BERT_BACKEND = "eager"
+
+# Maximum confidence difference allowed between a backend and the eager model
+BERT_BACKEND_TOLERANCE = 0.02
+
+# Where the "onnx" backend stores its exported graph (created on first load; a hash of
+# the weights is added to the file name, so a changed model is exported again)
+BERT_ONNX_PATH = "./mail_category.onnx"
+
+# Repeated emails reuse cached predictions (0 disables the cache)
+CLASSIFICATION_CACHE_SIZE = 4096
+
+# Optional SQLite file that keeps cached predictions across restarts (None = memory only)
+CLASSIFICATION_CACHE_PATH = None
+
+# Emails are cut to this many characters before tokenization (the model reads 128 tokens)
+CLASSIFY_MAX_CHARS = 2048
+
 # Path to the base Gemma model
 # This will be downloaded from the Hub
 GEMMA_BASE_MODEL_ID = "google/gemma-2b-it" 
@@ -15,10 +35,124 @@ GEMMA_BASE_MODEL_ID = "google/gemma-2b-it"
 # These will be downloaded from the Hub
 GEMMA_ADAPTER_PATH = "darshandugar/Corporate-Email-Response-Generator-gemma-2b"
 
-print("--- Configuration Loaded (Hugging Face Hub) ---")
-print(f"BERT Model ID: {BERT_MODEL}")
-print(f"Gemma Base Model ID: {GEMMA_BASE_MODEL_ID}")
-print(f"Gemma Adapter ID: {GEMMA_ADAPTER_PATH}")
+# Where merge_adapters.py saves the Gemma base with the LoRA adapters merged in.
+# When this folder exists it is loaded instead of base model + adapters.
+GEMMA_MERGED_MODEL_PATH = "./gemma_2b_merged"
+
+# Precision for Gemma on CPU-only hosts: "fp32", "bf16" or "int8" (dynamic quantization).
+# bf16/int8 change the generated text slightly and are only faster on some CPUs (bf16 needs
+# native bf16/AMX support); opt in after checking benchmarks/bench_generator_modes.py.
+GEMMA_CPU_MODE = "fp32"
+
+# Reuse the KV cache of the fixed instruction prefix so prefill only covers intent + details
+GEMMA_PREFIX_CACHE = True
+
+# Optional small draft model for assisted (speculative) decoding. It must share Gemma's
+# tokenizer. None disables assisted generation.
+GEMMA_ASSISTANT_MODEL_ID = None
+
+# Tokens the draft model proposes per verification step
+GEMMA_ASSISTANT_NUM_TOKENS = 5
+
+# --- Reply Reuse ---
+
+# Drafts kept for reuse on near-duplicate emails (0 disables reuse)
+REPLY_CACHE_SIZE = 1024
+
+# Minimum SimHash similarity (0-1) between email bodies for a draft to be reused
+REPLY_SIMILARITY_THRESHOLD = 0.9
+
+# --- Template Replies ---
+
+# Answer high-confidence routine emails from the templates below instead of running Gemma
+REPLY_TEMPLATES_ENABLED = True
+
+# intent -> minimum classifier confidence and a body filled from the task details
+# ({placeholders} name task_details fields, sender_email or original_subject).
+# "*" covers every intent without its own entry (the fallback handler).
+REPLY_TEMPLATES = {
+    "Merger Announcement": {
+        "min_confidence": 0.9,
+        "body": (
+            "Dear Sender,\n\n"
+            "Thank you for your email regarding the merger announcement. "
+            "{message} Your reference ticket is {ticket_id}.\n\n"
+            "We will keep you informed of any further updates.\n\n"
+            "Best regards,\nCorporate Assistant"
+        ),
+    },
+    "Sustainability Initiative": {
+        "min_confidence": 0.9,
+        "body": (
+            "Dear Sender,\n\n"
+            "Thank you for your interest in our sustainability initiatives. {rag_summary}\n\n"
+            "Please let us know if you need any further information.\n\n"
+            "Best regards,\nCorporate Assistant"
+        ),
+    },
+    "*": {
+        "min_confidence": 0.8,
+        "body": (
+            "Dear Sender,\n\n"
+            "Thank you for your email. {message}\n\n"
+            "Best regards,\nCorporate Assistant"
+        ),
+    },
+}
+
+# --- Inference Concurrency ---
+
+# Maximum number of Gemma generations allowed to run at once in arun_workflow
+MAX_CONCURRENT_GENERATIONS = 2
+
+# Gemma worker processes for many-core CPU hosts (0 or 1 = generate in the service process).
+# With several workers, also raise PIPELINE_GENERATE_WORKERS / MAX_CONCURRENT_GENERATIONS
+# to at least this number so every worker has an email to work on.
+GENERATION_WORKERS = 0
+
+# torch threads per worker process (None = available CPUs / GENERATION_WORKERS)
+GENERATION_THREADS_PER_WORKER = None
+
+# --- Graph Checkpointing ---
+
+# "none" (no checkpoints), "memory" (bounded in-memory) or "sqlite" (bounded, on disk)
+CHECKPOINTER = "memory"
+
+# Number of email runs whose checkpoints are kept; older ones are evicted
+CHECKPOINT_MAX_THREADS = 1000
+
+# Runs idle for longer than this many seconds are evicted (None = no TTL)
+CHECKPOINT_TTL_SECONDS = 3600
+
+# Database file used when CHECKPOINTER = "sqlite"
+CHECKPOINT_SQLITE_PATH = "checkpoints.sqlite"
+
+# --- Metrics ---
+
+# Record per-node, Gmail and Gemma timings (off = no overhead)
+METRICS_ENABLED = False
+
+# Serve Prometheus metrics at http://localhost:<port>/metrics (None = no HTTP endpoint)
+METRICS_PORT = None
+
+# Also write the metrics to this file for node_exporter's textfile collector (None = off)
+METRICS_FILE = None
+
+# Seconds between metric file rewrites
+METRICS_FILE_INTERVAL_SECONDS = 15
+
+# --- Startup ---
+
+# Load both models in a background thread as soon as the service starts
+PRELOAD_MODELS = True
+
+
+def print_config():
+    """Prints the active model configuration (called by the service, not on import)."""
+    print("--- Configuration Loaded (Hugging Face Hub) ---")
+    print(f"BERT Model ID: {BERT_MODEL}")
+    print(f"Gemma Base Model ID: {GEMMA_BASE_MODEL_ID}")
+    print(f"Gemma Adapter ID: {GEMMA_ADAPTER_PATH}")
 
 # from google import drive
 # import os
@@ -0,0 +1,83 @@
+import collections
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+
+class FairExecutor:
+    """
+    Thread pool that serves several submitters (e.g. mailboxes) round-robin.
+
+    Each key has its own FIFO queue; workers take the next task from the key that
+    was served longest ago, so a mailbox with a large backlog only gets its turn
+    like everyone else instead of filling the pool. With `max_in_flight_per_key`,
+    a key never has more tasks running at once than that, leaving the remaining
+    workers for other keys.
+    """
+    def __init__(self, workers: int = 1, max_in_flight_per_key: Optional[int] = None, name: str = "fair"):
+        self.max_in_flight_per_key = max_in_flight_per_key
+        self._queues = collections.OrderedDict()   # key -> deque, least recently served first
+        self._in_flight = collections.Counter()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """Queues fn(*args, **kwargs) on behalf of `key`; returns its Future."""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("FairExecutor is closed")
+            self._queues.setdefault(key, collections.deque()).append((future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def pending(self) -> dict:
+        """Number of queued (not yet running) tasks per key."""
+        with self._condition:
+            return {key: len(tasks) for key, tasks in self._queues.items()}
+
+    def close(self) -> None:
+        """Runs every queued task, then stops the workers."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _next_task(self):
+        # Caller holds the condition
+        for key, tasks in self._queues.items():
+            if tasks and (self.max_in_flight_per_key is None
+                          or self._in_flight[key] < self.max_in_flight_per_key):
+                self._queues.move_to_end(key)  # Served now, so it goes to the back of the line
+                self._in_flight[key] += 1
+                return key, tasks.popleft()
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    if self._closed and not any(self._queues.values()):
+                        return
+                    self._condition.wait()
+                    task = self._next_task()
+
+            key, (future, fn, args, kwargs) = task
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._condition:
+                self._in_flight[key] -= 1
+                # A key that was at its cap may have runnable tasks again
+                self._condition.notify_all()
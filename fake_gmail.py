@@ -0,0 +1,291 @@
+"""
+An in-process stand-in for the Gmail API service object returned by
+`googleapiclient.discovery.build('gmail', 'v1', ...)`.
+
+It implements the subset of calls used by recieve_mail.py with a configurable
+simulated round-trip latency per HTTP request, so fetching strategies can be
+benchmarked offline without credentials or network access.
+"""
+import base64
+import random
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+# historyTypes filter values -> the key that holds those changes in a history record
+_HISTORY_RECORD_KEYS = {
+    'messageAdded': 'messagesAdded',
+    'messageDeleted': 'messagesDeleted',
+    'labelAdded': 'labelsAdded',
+    'labelRemoved': 'labelsRemoved',
+}
+
+
+def _http_error(status, reason):
+    """Builds an HttpError shaped like the ones googleapiclient raises."""
+    return HttpError(httplib2.Response({'status': status, 'reason': reason}), reason.encode('utf-8'))
+
+
+def make_message(msg_id, sender, subject, body, internal_date=None, unread=True):
+    """Creates a stored message in the shape FakeGmailService keeps internally."""
+    return {
+        'id': msg_id,
+        'threadId': msg_id,
+        'sender': sender,
+        'subject': subject,
+        'body': body,
+        'internalDate': int(internal_date if internal_date is not None else time.time()),
+        'labelIds': ['INBOX', 'UNREAD'] if unread else ['INBOX'],
+    }
+
+
+class _FakeRequest:
+    """Mimics googleapiclient.http.HttpRequest: nothing happens until execute()."""
+
+    def __init__(self, service, handler):
+        self._service = service
+        self._handler = handler
+
+    def execute(self):
+        self._service._round_trip()
+        return self._handler()
+
+
+class _FakeBatch:
+    """Mimics BatchHttpRequest: all added requests cost a single round trip."""
+
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self):
+        self._service._round_trip()
+        for request_id, request, callback in self._requests:
+            response, exception = None, None
+            try:
+                exception = self._service._maybe_fail()
+                if exception is None:
+                    response = request._handler()
+            except HttpError as error:
+                exception = error
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', q='', pageToken=None, maxResults=100, **kwargs):
+        return _FakeRequest(self._service, lambda: self._service._list(q, pageToken, maxResults))
+
+    def get(self, userId='me', id=None, format='full', metadataHeaders=None, **kwargs):
+        return _FakeRequest(self._service, lambda: self._service._get(id, format, metadataHeaders))
+
+    def modify(self, userId='me', id=None, body=None, **kwargs):
+        return _FakeRequest(self._service, lambda: self._service._modify([id], body or {}))
+
+    def batchModify(self, userId='me', body=None, **kwargs):
+        body = body or {}
+        return _FakeRequest(self._service, lambda: self._service._modify(body.get('ids', []), body))
+
+    def send(self, userId='me', body=None, **kwargs):
+        return _FakeRequest(self._service, lambda: self._service._send(body or {}))
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId='me', startHistoryId=None, historyTypes=None, labelId=None,
+             pageToken=None, maxResults=100, **kwargs):
+        return _FakeRequest(
+            self._service,
+            lambda: self._service._history_list(startHistoryId, historyTypes, labelId, pageToken, maxResults)
+        )
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def messages(self):
+        return _Messages(self._service)
+
+    def history(self):
+        return _History(self._service)
+
+    def getProfile(self, userId='me', **kwargs):
+        return _FakeRequest(self._service, lambda: {
+            'emailAddress': self._service.email_address,
+            'historyId': str(self._service.history_id),
+        })
+
+
+class FakeGmailService:
+    """
+    Offline replacement for the Gmail service object.
+
+    Args:
+        messages (list): Stored messages, e.g. built with make_message().
+        latency (float): Simulated seconds per HTTP round trip (a batch counts once).
+        failure_rate (float): Probability that an individual batched item fails with a 503.
+        email_address (str): Address returned by users().getProfile().
+    """
+
+    def __init__(self, messages=None, latency=0.05, failure_rate=0.0,
+                 email_address='assistant@example.com', seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.email_address = email_address
+        self.sent = []
+        self.round_trips = 0
+        self._messages = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self.history_id = 1
+        self._history = []           # (history_id, record) pairs, oldest first
+        self._oldest_history_id = 1  # startHistoryId below this answers 404
+        self._rng = random.Random(seed)
+        for message in messages or []:
+            self.add_message(message)
+
+    # --- googleapiclient-shaped entry points ---
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self, callback)
+
+    # --- Test helpers ---
+    def add_message(self, message):
+        """Delivers a new message into the fake mailbox."""
+        with self._lock:
+            self._messages[message['id']] = dict(message)
+            self._order.append(message['id'])
+            self._record_history('messagesAdded', message['id'])
+
+    def expire_history(self):
+        """Drops all stored history, as Gmail does after roughly a week."""
+        with self._lock:
+            self._history = []
+            self._oldest_history_id = self.history_id + 1
+
+    # --- Internals ---
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _maybe_fail(self):
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            return _http_error(503, 'Backend Error')
+        return None
+
+    def _record_history(self, kind, msg_id):
+        # Caller holds the lock
+        self.history_id += 1
+        message = self._messages[msg_id]
+        summary = {'id': msg_id, 'threadId': message['threadId'], 'labelIds': list(message['labelIds'])}
+        self._history.append((self.history_id, {'id': str(self.history_id), kind: [{'message': summary}]}))
+
+    def _history_list(self, start_history_id, history_types, label_id, page_token, max_results):
+        start_history_id = int(start_history_id)
+        if start_history_id < self._oldest_history_id:
+            raise _http_error(404, 'Requested entity was not found.')
+        with self._lock:
+            records = [
+                record for history_id, record in self._history
+                if history_id > start_history_id
+                and (not history_types or any(_HISTORY_RECORD_KEYS[kind] in record for kind in history_types))
+                and (not label_id or any(label_id in entry['message']['labelIds']
+                                         for key, entries in record.items() if key != 'id'
+                                         for entry in entries))
+            ]
+            current = self.history_id
+        offset = int(page_token or 0)
+        result = {'historyId': str(current)}
+        if records[offset:offset + max_results]:
+            result['history'] = records[offset:offset + max_results]
+        if offset + max_results < len(records):
+            result['nextPageToken'] = str(offset + max_results)
+        return result
+
+    def _matches(self, message, q):
+        for term in q.split():
+            if term == 'is:unread' and 'UNREAD' not in message['labelIds']:
+                return False
+            if term == 'in:inbox' and 'INBOX' not in message['labelIds']:
+                return False
+            if term.startswith('after:') and message['internalDate'] <= int(term[len('after:'):]):
+                return False
+        return True
+
+    def _list(self, q, page_token, max_results):
+        with self._lock:
+            # Gmail lists newest first
+            matching = [msg_id for msg_id in reversed(self._order) if self._matches(self._messages[msg_id], q)]
+        offset = int(page_token or 0)
+        page = matching[offset:offset + max_results]
+        result = {'resultSizeEstimate': len(matching)}
+        if page:
+            result['messages'] = [{'id': msg_id, 'threadId': self._messages[msg_id]['threadId']} for msg_id in page]
+        if offset + max_results < len(matching):
+            result['nextPageToken'] = str(offset + max_results)
+        return result
+
+    def _get(self, msg_id, msg_format, metadata_headers):
+        with self._lock:
+            message = self._messages.get(msg_id)
+        if message is None:
+            raise _http_error(404, 'Requested entity was not found.')
+        headers = [
+            {'name': 'From', 'value': message['sender']},
+            {'name': 'Subject', 'value': message['subject']},
+        ]
+        if metadata_headers:
+            wanted = {name.lower() for name in metadata_headers}
+            headers = [header for header in headers if header['name'].lower() in wanted]
+        payload = {'mimeType': 'text/plain', 'headers': headers}
+        if msg_format == 'full':
+            payload['body'] = {
+                'size': len(message['body']),
+                'data': base64.urlsafe_b64encode(message['body'].encode('utf-8')).decode('ascii'),
+            }
+        return {
+            'id': msg_id,
+            'threadId': message['threadId'],
+            'labelIds': list(message['labelIds']),
+            'snippet': message['body'][:100],
+            'internalDate': str(message['internalDate'] * 1000),
+            'payload': payload,
+        }
+
+    def _modify(self, msg_ids, body):
+        with self._lock:
+            for msg_id in msg_ids:
+                message = self._messages.get(msg_id)
+                if message is None:
+                    continue
+                labels = [label for label in message['labelIds'] if label not in body.get('removeLabelIds', [])]
+                labels += [label for label in body.get('addLabelIds', []) if label not in labels]
+                message['labelIds'] = labels
+                if body.get('removeLabelIds'):
+                    self._record_history('labelsRemoved', msg_id)
+        return {}
+
+    def _send(self, body):
+        with self._lock:
+            sent_id = f'sent-{len(self.sent) + 1}'
+            self.sent.append(dict(body, id=sent_id))
+        return {'id': sent_id, 'labelIds': ['SENT']}
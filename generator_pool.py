@@ -0,0 +1,280 @@
+import atexit
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+# Message kinds sent from the worker processes to the pool
+_READY = "ready"
+_DIED = "died"
+
+# Seconds the workers may take to load the model before the pool gives up
+STARTUP_TIMEOUT_SECONDS = 600
+
+
+def _cpu_slices(num_workers: int, threads_per_worker: Optional[int], pin_cpus: bool):
+    """Splits the CPUs this process may use into one disjoint slice per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    threads = threads_per_worker or max(1, len(cpus) // num_workers)
+    if not pin_cpus or not hasattr(os, "sched_setaffinity") or threads * num_workers > len(cpus):
+        return [(None, threads)] * num_workers
+    return [(cpus[i * threads:(i + 1) * threads], threads) for i in range(num_workers)]
+
+
+def _worker_main(index, task_queue, result_queue, cpus, num_threads, generator=None, generator_kwargs=None):
+    import torch
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(num_threads)
+
+    try:
+        if generator is None:
+            from reply_generator import EmailGenerator
+            generator = EmailGenerator(**generator_kwargs)
+    except Exception as e:
+        result_queue.put((_READY, index, f"{type(e).__name__}: {e}"))
+        return
+    result_queue.put((_READY, index, None))
+
+    parent = os.getppid()
+    while True:
+        try:
+            task = task_queue.get(timeout=1)
+        except queue.Empty:
+            # Exit with the parent (pool or zygote) instead of lingering as an orphan
+            if os.getppid() != parent:
+                break
+            continue
+        if task is None:
+            break
+        task_id, intent, details = task
+        try:
+            result_queue.put((task_id, generator.generate(intent=intent, details=details), None))
+        except Exception as e:
+            result_queue.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+def _zygote_main(task_queue, result_queue, slices, generator_kwargs):
+    """
+    Loads the generator once and forks every worker from it, so all workers share the
+    weights copy-on-write. Runs in a freshly spawned process: forking a process that has
+    already run multi-threaded (OpenMP) PyTorch code can deadlock the children.
+    """
+    import torch
+    # Load single-threaded so OpenMP is never started before the fork
+    torch.set_num_threads(1)
+
+    try:
+        from reply_generator import EmailGenerator
+        generator = EmailGenerator(**generator_kwargs)
+    except Exception as e:
+        for index in range(len(slices)):
+            result_queue.put((_READY, index, f"{type(e).__name__}: {e}"))
+        return
+
+    fork = multiprocessing.get_context("fork")
+    workers = [
+        fork.Process(target=_worker_main, name=f"generator-{index}",
+                     args=(index, task_queue, result_queue, cpus, threads, generator))
+        for index, (cpus, threads) in enumerate(slices)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Report workers that crash (e.g. killed for running out of memory)
+    remaining = {worker.sentinel: index for index, worker in enumerate(workers)}
+    while remaining:
+        for sentinel in multiprocessing.connection.wait(list(remaining)):
+            index = remaining.pop(sentinel)
+            workers[index].join()  # Sets exitcode
+            if workers[index].exitcode != 0:
+                result_queue.put((_DIED, workers[index].name, f"exit code {workers[index].exitcode}"))
+
+
+class GeneratorPool:
+    """
+    Runs EmailGenerator in several worker processes so generation scales across many cores.
+
+    Each worker gets its own disjoint set of CPUs (sched_setaffinity) and
+    torch.set_num_threads, which avoids the diminishing returns of one large intra-op
+    thread pool and keeps the GIL of one process out of the others' way. Where fork is
+    available (and CUDA is not, since a forked CUDA context is unusable) the weights are
+    loaded once and shared copy-on-write between workers; elsewhere every worker loads
+    its own copy.
+
+    If a worker process dies, every request in flight fails and the pool refuses new
+    ones instead of leaving callers blocked. The pool closes itself at interpreter exit,
+    so a script that never calls close() does not hang waiting for its workers.
+
+    generate() is thread-safe and has the same signature as EmailGenerator.generate(),
+    so the pool can be used as the graph's generator. Keep at least `num_workers`
+    requests in flight (e.g. pipeline generate workers) to keep every worker busy.
+    """
+    def __init__(self, num_workers: int = 2, threads_per_worker: Optional[int] = None,
+                 pin_cpus: bool = True, share_weights: bool = True,
+                 startup_timeout: float = STARTUP_TIMEOUT_SECONDS, **generator_kwargs):
+        """
+        Args:
+            num_workers (int): Number of generator processes.
+            threads_per_worker (int, optional): torch threads per worker (default: CPUs / workers).
+            pin_cpus (bool): Pin each worker to its own CPUs when there are enough of them.
+            share_weights (bool): Load the weights once and fork the workers from that process.
+            startup_timeout (float): Seconds to wait for every worker to load the model.
+            **generator_kwargs: Passed to EmailGenerator (base_model_id, adapter_path, ...).
+        """
+        self.num_workers = num_workers
+        self.share_weights = share_weights and "fork" in multiprocessing.get_all_start_methods()
+        if self.share_weights and _cuda_available():
+            print("CUDA is available; generator workers load their own weights instead of forking.")
+            self.share_weights = False
+        self._context = multiprocessing.get_context("spawn")
+        self._task_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._broken = None
+        self._closing = False
+        self._closed = False
+
+        slices = _cpu_slices(num_workers, threads_per_worker, pin_cpus)
+        if self.share_weights:
+            self._processes = [self._context.Process(
+                target=_zygote_main, name="generator-zygote",
+                args=(self._task_queue, self._result_queue, slices, generator_kwargs)
+            )]
+        else:
+            self._processes = [
+                self._context.Process(
+                    target=_worker_main, name=f"generator-{index}",
+                    args=(index, self._task_queue, self._result_queue, cpus, threads, None, generator_kwargs)
+                )
+                for index, (cpus, threads) in enumerate(slices)
+            ]
+        for process in self._processes:
+            process.start()
+
+        print(f"--- Starting {num_workers} generator worker(s) "
+              f"({'shared' if self.share_weights else 'separate'} weights) ---")
+        self._wait_until_ready(startup_timeout)
+        self._dispatcher = threading.Thread(target=self._dispatch_results, name="generator-pool", daemon=True)
+        self._dispatcher.start()
+        self._monitor = threading.Thread(target=self._monitor_processes, name="generator-monitor", daemon=True)
+        self._monitor.start()
+        atexit.register(self.close)
+
+    def generate(self, intent: str, details: str) -> str:
+        """Generates one email in a worker process (blocks until it is done)."""
+        return self.submit(intent, details).result()
+
+    def generate_batch(self, requests: List[Tuple[str, str]], batch_size: int = 8) -> List[str]:
+        """Spreads (intent, details) requests over the workers; results keep the input order."""
+        futures = [self.submit(intent, details) for intent, details in requests]
+        return [future.result() for future in futures]
+
+    def submit(self, intent: str, details: str) -> Future:
+        future = Future()
+        with self._pending_lock:
+            if self._broken:
+                raise RuntimeError(f"Generator pool is broken: {self._broken}")
+            task_id = next(self._task_ids)
+            self._pending[task_id] = future
+        self._task_queue.put((task_id, intent, details))
+        return future
+
+    def close(self) -> None:
+        """Lets the workers finish queued requests, then stops them. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._closing = True
+        for _ in range(self.num_workers):
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join()
+        self._result_queue.put(None)
+        self._dispatcher.join()
+        self._monitor.join()
+
+    def _wait_until_ready(self, timeout):
+        errors = []
+        ready = 0
+        deadline = time.monotonic() + timeout
+        while ready < self.num_workers and not errors:
+            try:
+                kind, index, error = self._result_queue.get(timeout=1)
+            except queue.Empty:
+                # A process that died while loading never reports, so check on them
+                dead = [p for p in self._processes if p.exitcode is not None]
+                if dead:
+                    errors.extend(f"{p.name} exited with code {p.exitcode}" for p in dead)
+                elif time.monotonic() > deadline:
+                    errors.append(f"not ready after {timeout} seconds")
+                continue
+            if kind == _DIED:
+                errors.append(f"{index} died ({error})")
+            elif error:
+                errors.append(f"worker {index}: {error}")
+            else:
+                ready += 1
+        if errors:
+            for process in self._processes:
+                process.terminate()
+            raise RuntimeError("Generator workers failed to start: " + "; ".join(errors))
+
+    def _monitor_processes(self):
+        # Reports processes the pool started directly (workers, or the zygote) that end
+        # before close(); the zygote itself reports the workers it forked
+        remaining = {process.sentinel: process for process in self._processes}
+        while remaining:
+            for sentinel in multiprocessing.connection.wait(list(remaining)):
+                process = remaining.pop(sentinel)
+                process.join()  # Sets exitcode
+                if process.exitcode != 0 or not self._closing:
+                    self._result_queue.put((_DIED, process.name, f"exit code {process.exitcode}"))
+
+    def _dispatch_results(self):
+        while True:
+            try:
+                message = self._result_queue.get()
+            except (EOFError, OSError):
+                return  # The queue was torn down (interpreter shutdown)
+            if message is None:
+                return
+            task_id, text, error = message
+
+            if task_id == _DIED:
+                # The crashed worker's request is lost; fail everything in flight
+                with self._pending_lock:
+                    self._broken = f"{text} died ({error})"
+                    pending, self._pending = self._pending, {}
+                for future in pending.values():
+                    future.set_exception(RuntimeError(f"Generator pool is broken: {self._broken}"))
+                continue
+
+            with self._pending_lock:
+                future = self._pending.pop(task_id, None)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(text)
+
+
+def _cuda_available():
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
@@ -1,22 +1,81 @@
+import hashlib
+import os
+from typing import List, Optional
+
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
+from classification_cache import ClassificationCache
+from mime_extract import clip
+
+# Inference backends: eager PyTorch, dynamic int8 quantization, traced TorchScript, exported ONNX
+BACKENDS = ("eager", "int8", "torchscript", "onnx")
+
+# Sample emails used to check a non-eager backend against the eager model on load
+VALIDATION_TEXTS = [
+    "Can you send over the latest financial performance report for Q3?",
+    "We are excited to announce our upcoming merger with Tech Solutions Inc.",
+    "Please share the carbon emission numbers from the sustainability report.",
+    "Hi team, reminder that the office will be closed on Friday for maintenance.",
+    "Following up on the vendor contract renewal. Legal has asked for a revised indemnity "
+    "clause and a copy of the updated insurance certificate before approving the final draft.",
+    "Thanks!",
+]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wraps a Hugging Face classifier so tracing/export sees (input_ids, attention_mask) -> logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def _weights_fingerprint(model) -> str:
+    """Short hash of a model's parameters and buffers."""
+    digest = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()[:16]
 
 
 class IntentClassifier:
     """
     A reusable classifier that loads a fine-tuned model once for efficient, repeated predictions.
     """
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, cache_size: int = 0, cache_path: Optional[str] = None,
+                 backend: str = "eager", onnx_path: Optional[str] = None, tolerance: float = 0.02,
+                 device: Optional[str] = None, max_input_chars: Optional[int] = 2048):
         """
         Initializes the classifier by loading the tokenizer and model.
 
         Args:
             model_path (str): The path to the saved fine-tuned model and tokenizer.
+            cache_size (int): Predictions kept in an in-memory LRU cache (0 disables caching).
+            cache_path (str, optional): SQLite file that persists cached predictions across restarts.
+            backend (str): One of BACKENDS. Non-eager backends run on CPU and are checked
+                against the eager model on load; if they disagree, eager is used instead.
+            onnx_path (str, optional): Where the ONNX export is stored (exported on first use). A hash
+                of the weights is added to the file name, so changed weights are exported again.
+            tolerance (float): Maximum allowed confidence difference from the eager model.
+            device (str, optional): Force 'cpu' or 'cuda'; defaults to GPU when available.
+            max_input_chars (int, optional): Texts are cut to this many characters before
+                tokenization. The model only sees 128 tokens, so tokenizing a huge email is wasted work.
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
         # Set the device to GPU if available, otherwise CPU
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if backend in ("int8", "onnx"):
+            # Dynamic quantization and ONNX Runtime (CPU provider) only run on CPU
+            self.device = "cpu"
         print(f"Using device: {self.device}")
+        self.max_input_chars = max_input_chars
 
         # Load the tokenizer and model from the specified path
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
@@ -30,6 +89,19 @@ class IntentClassifier:
 
         # Get the label mapping from the model's configuration
         self.id_to_label = self.model.config.id2label
+        revision = getattr(self.model.config, "_commit_hash", None) or "local"
+
+        # Swap in the requested backend once it matches the eager model
+        self.backend = "eager"
+        if backend != "eager":
+            self._load_backend(backend, model_path, onnx_path, tolerance)
+
+        # Cache predictions for repeated emails, scoped to this exact model revision and backend
+        self.cache = None
+        if cache_size > 0:
+            self.cache = ClassificationCache(
+                f"{model_path}@{revision}/{self.backend}", max_entries=cache_size, db_path=cache_path
+            )
 
     def predict(self, text: str) -> dict:
         """
@@ -41,6 +113,14 @@ class IntentClassifier:
         Returns:
             dict: A dictionary containing the predicted 'label' and its 'confidence' score.
         """
+        text = clip(text, self.max_input_chars)
+
+        # Identical (or whitespace-only different) emails skip the forward pass
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+
         # Tokenize the input text and return PyTorch tensors
         inputs = self.tokenizer(
             text,
@@ -52,11 +132,171 @@ class IntentClassifier:
 
         # Perform inference without calculating gradients to save memory and speed up
         with torch.no_grad():
-            outputs = self.model(**inputs)
-        
-        # Get the model's predictions (logits)
-        logits = outputs.logits
-        
+            # Get the model's predictions (logits)
+            logits = self._forward(inputs)
+
+        prediction = self._to_predictions(logits)[0]
+        if self.cache is not None:
+            self.cache.put(text, prediction)
+        return prediction
+
+    def predict_batch(self, texts: List[str], batch_size: int = 32) -> List[dict]:
+        """
+        Classifies the intent of many text strings with as few forward passes as possible.
+
+        Inputs are sorted by token length and split into buckets of `batch_size`,
+        so each bucket is only padded to its own longest sequence.
+
+        Args:
+            texts (List[str]): The input texts to classify.
+            batch_size (int): Maximum number of texts per forward pass.
+
+        Returns:
+            List[dict]: One prediction per input, in the same order as `texts`.
+        """
+        if not texts:
+            return []
+        texts = [clip(text, self.max_input_chars) for text in texts]
+
+        if self.cache is None:
+            return self._predict_batch_uncached(texts, batch_size)
+
+        # Answer cached texts directly; run the model once per distinct uncached text
+        results = [self.cache.get(text) for text in texts]
+        missing = {}
+        for text, result in zip(texts, results):
+            if result is None:
+                missing.setdefault(self.cache.key(text), text)
+        computed = dict(zip(missing, self._predict_batch_uncached(list(missing.values()), batch_size)))
+        for key, text in missing.items():
+            self.cache.put(text, computed[key])
+        return [
+            result if result is not None else dict(computed[self.cache.key(text)])
+            for text, result in zip(texts, results)
+        ]
+
+    def _predict_batch_uncached(self, texts: List[str], batch_size: int) -> List[dict]:
+        if not texts:
+            return []
+
+        # 1. Tokenize everything once without padding to learn each text's length
+        encodings = self.tokenizer(
+            list(texts),
+            truncation=True,
+            max_length=128,
+        )
+        input_ids = encodings["input_ids"]
+
+        # 2. Sort indices by token length so similar lengths share a bucket
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+
+        results = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+
+            # 3. Pad the bucket only to its own longest sequence
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+            inputs = self.tokenizer.pad(
+                features,
+                padding="longest",
+                return_tensors="pt"
+            ).to(self.device)
+
+            # 4. One forward pass per bucket
+            with torch.no_grad():
+                logits = self._forward(inputs)
+
+            # 5. Scatter predictions back to their original positions
+            for i, prediction in zip(bucket, self._to_predictions(logits)):
+                results[i] = prediction
+
+        return results
+
+    def _forward(self, inputs):
+        """Runs the active backend and returns logits as a torch tensor."""
+        if self.backend == "torchscript":
+            return self.model(inputs["input_ids"], inputs["attention_mask"])
+        if self.backend == "onnx":
+            feed = {
+                "input_ids": inputs["input_ids"].cpu().numpy(),
+                "attention_mask": inputs["attention_mask"].cpu().numpy(),
+            }
+            return torch.from_numpy(self.model.run(["logits"], feed)[0])
+        # eager and int8 are both regular nn.Modules
+        return self.model(**inputs).logits
+
+    def _load_backend(self, backend: str, model_path: str, onnx_path: Optional[str], tolerance: float):
+        """Builds the requested backend and keeps it only if it agrees with the eager model."""
+        eager_model = self.model
+        sample = self.tokenizer(
+            VALIDATION_TEXTS, padding=True, truncation=True, max_length=128, return_tensors="pt"
+        ).to(self.device)
+
+        print(f"Building '{backend}' backend...")
+        try:
+            if backend == "int8":
+                candidate = torch.ao.quantization.quantize_dynamic(eager_model, {torch.nn.Linear}, dtype=torch.qint8)
+            elif backend == "torchscript":
+                with torch.no_grad():
+                    candidate = torch.jit.trace(
+                        _LogitsOnly(eager_model).eval(), (sample["input_ids"], sample["attention_mask"])
+                    )
+                candidate = torch.jit.freeze(candidate)
+            else:
+                candidate = self._load_onnx_session(eager_model, sample, onnx_path or f"{model_path.rstrip('/')}.onnx")
+
+            # Compare labels and confidences on the validation texts
+            with torch.no_grad():
+                expected = self._to_predictions(eager_model(**sample).logits)
+                self.model, self.backend = candidate, backend
+                actual = self._to_predictions(self._forward(sample))
+        except Exception as e:
+            actual, error = None, e
+
+        if actual is None:
+            print(f"'{backend}' backend failed ({error}). Falling back to eager.")
+        else:
+            worst = max(abs(a["confidence"] - e["confidence"]) for a, e in zip(actual, expected))
+            labels_match = all(a["label"] == e["label"] for a, e in zip(actual, expected))
+            if labels_match and worst <= tolerance:
+                print(f"'{backend}' backend validated (max confidence diff {worst:.4f}).")
+                return
+            print(f"'{backend}' backend disagrees with eager (labels match: {labels_match}, "
+                  f"max confidence diff {worst:.4f} > {tolerance}). Falling back to eager.")
+
+        self.model, self.backend = eager_model, "eager"
+
+    def _load_onnx_session(self, eager_model, sample, onnx_path: str):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The 'onnx' backend needs onnxruntime: pip install onnxruntime")
+
+        # The export is keyed on the weights, so an export of an older model is never reused
+        stem, extension = os.path.splitext(onnx_path)
+        onnx_path = f"{stem}.{_weights_fingerprint(eager_model)}{extension or '.onnx'}"
+        if not os.path.exists(onnx_path):
+            print(f"Exporting ONNX model to: {onnx_path}...")
+            torch.onnx.export(
+                _LogitsOnly(eager_model),
+                (sample["input_ids"], sample["attention_mask"]),
+                onnx_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=17,
+            )
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def _to_predictions(self, logits) -> List[dict]:
+        """Converts a batch of logits into label/confidence dictionaries."""
         # Apply softmax to convert logits to probabilities
         probabilities = torch.softmax(logits, dim=1)
         
@@ -64,13 +304,14 @@ class IntentClassifier:
         confidence, predicted_id_tensor = torch.max(probabilities, dim=1)
         
         # Convert tensor results to standard Python types
-        predicted_id = predicted_id_tensor.item()
-        confidence_score = confidence.item()
+        predicted_ids = predicted_id_tensor.tolist()
+        confidence_scores = confidence.tolist()
         
         # Map the predicted ID to its corresponding label string
-        predicted_label = self.id_to_label[predicted_id]
-
-        return {"label": predicted_label, "confidence": confidence_score}
+        return [
+            {"label": self.id_to_label[predicted_id], "confidence": confidence_score}
+            for predicted_id, confidence_score in zip(predicted_ids, confidence_scores)
+        ]
 
 # --- HOW TO USE THE CLASS ---
 if __name__ == "__main__":
@@ -94,3 +335,8 @@ if __name__ == "__main__":
 
     print(f"Text: '{text_to_classify_2}'")
     print(f"Predicted Intent: {prediction_2['label']} (Confidence: {prediction_2['confidence']:.4f})\n")
+
+    # 4. Classify several texts at once (one forward pass per length bucket)
+    batch_predictions = classifier.predict_batch([text_to_classify_1, text_to_classify_2])
+    for text, prediction in zip([text_to_classify_1, text_to_classify_2], batch_predictions):
+        print(f"[batch] '{text[:40]}...' -> {prediction['label']} ({prediction['confidence']:.4f})")
@@ -0,0 +1,158 @@
+import json
+import os
+
+from googleapiclient.errors import HttpError
+
+from metrics import metrics
+
+# Polls in a row that may fail to fetch a listed message before it is dropped
+MAX_FETCH_ATTEMPTS = 5
+
+
+def list_all_message_ids(service, query, page_size=100):
+    """Lists every message ID matching `query`, following nextPageToken across all pages."""
+    msg_ids = []
+    page_token = None
+    while True:
+        with metrics.timer("gmail_request_seconds", call="list"):
+            result = service.users().messages().list(
+                userId='me',
+                q=query,
+                pageToken=page_token,
+                maxResults=page_size
+            ).execute()
+        msg_ids.extend(msg['id'] for msg in result.get('messages', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return msg_ids
+
+
+class MailboxSync:
+    """
+    Tracks the mailbox with Gmail's historyId so each poll only returns newly added mail.
+
+    The first poll (and any poll after the stored history has expired) does a full,
+    paginated resync with the unread-inbox query. Every later poll calls
+    users.history.list from the last seen historyId, so its cost grows with the
+    amount of new mail rather than with the mailbox size.
+
+    The cursor only moves in commit(), once the caller has fetched the listed
+    messages. A poll whose fetch fails is therefore listed again, and messages that
+    could not be fetched are returned again by the next polls (up to
+    MAX_FETCH_ATTEMPTS), so a failed fetch never loses mail.
+    """
+    def __init__(self, service, start_timestamp, state_file=None, page_size=100):
+        """
+        Args:
+            service: The Gmail API service object.
+            start_timestamp (int): Unix time; mail received before it is ignored on full resync.
+            state_file (str, optional): JSON file used to persist the historyId across restarts.
+            page_size (int): Results requested per page from the Gmail API.
+        """
+        self.service = service
+        self.start_timestamp = start_timestamp
+        self.state_file = state_file
+        self.page_size = page_size
+        self.history_id, self.unfetched = self._load_state()
+        self.full_syncs = 0
+        self._next_history_id = None
+
+    def poll(self):
+        """
+        Returns the IDs of unread inbox messages added since the last commit(),
+        plus those an earlier poll listed but could not fetch.
+        """
+        if self.history_id is None:
+            msg_ids = self.full_sync()
+        else:
+            try:
+                msg_ids = self._incremental_sync()
+            except HttpError as error:
+                # 404 means startHistoryId is too old; Gmail only keeps history for a limited time
+                if getattr(error.resp, 'status', None) == 404:
+                    print("History expired. Falling back to a full resync...")
+                    msg_ids = self.full_sync()
+                else:
+                    raise
+        listed = set(msg_ids)
+        return [msg_id for msg_id in self.unfetched if msg_id not in listed] + msg_ids
+
+    def commit(self, polled_ids, fetched_ids):
+        """
+        Moves the cursor past the last poll once its messages are fetched.
+        Polled IDs that were not fetched are returned again by the next polls.
+        """
+        fetched = set(fetched_ids)
+        unfetched = {}
+        for msg_id in polled_ids:
+            if msg_id in fetched:
+                continue
+            attempts = self.unfetched.get(msg_id, 0) + 1
+            if attempts < MAX_FETCH_ATTEMPTS:
+                unfetched[msg_id] = attempts
+            else:
+                print(f"Giving up on message {msg_id} after {attempts} failed fetches.")
+        self.unfetched = unfetched
+        self._save_state(self._next_history_id or self.history_id)
+
+    def full_sync(self):
+        """Lists all unread inbox mail since start_timestamp; commit() then resets the historyId cursor."""
+        # Record the cursor BEFORE listing so nothing that arrives mid-listing is missed
+        with metrics.timer("gmail_request_seconds", call="get_profile"):
+            profile = self.service.users().getProfile(userId='me').execute()
+        history_id = profile['historyId']
+
+        msg_ids = list_all_message_ids(
+            self.service,
+            f"is:unread in:inbox after:{self.start_timestamp}",
+            page_size=self.page_size
+        )
+        self.full_syncs += 1
+        self._next_history_id = history_id
+        return msg_ids
+
+    def _incremental_sync(self):
+        msg_ids = []
+        seen = set()
+        page_token = None
+        latest_history_id = self.history_id
+        while True:
+            with metrics.timer("gmail_request_seconds", call="history"):
+                result = self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=self.history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',
+                    pageToken=page_token,
+                    maxResults=self.page_size
+                ).execute()
+
+            for record in result.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added['message']
+                    labels = message.get('labelIds', [])
+                    if 'UNREAD' in labels and 'INBOX' in labels and message['id'] not in seen:
+                        seen.add(message['id'])
+                        msg_ids.append(message['id'])
+
+            latest_history_id = result.get('historyId', latest_history_id)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+        self._next_history_id = latest_history_id
+        return msg_ids
+
+    def _load_state(self):
+        if self.state_file and os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                state = json.load(f)
+            return state.get('historyId'), state.get('unfetched', {})
+        return None, {}
+
+    def _save_state(self, history_id):
+        self.history_id = history_id
+        self._next_history_id = None
+        if self.state_file:
+            with open(self.state_file, 'w') as f:
+                json.dump({'historyId': history_id, 'unfetched': self.unfetched}, f)
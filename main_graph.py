@@ -1,29 +1,129 @@
 import os
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, Optional, List
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver  # Needed for graph state
 import uuid
+import weakref
+import functools
+import threading
 # from google import drive
 
-# --- Import your model classes ---
-from intent_classify import IntentClassifier
-from config import BERT_MODEL
-from config import GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH
-from reply_generator import EmailGenerator
+# --- Model settings (the model classes themselves are imported lazily) ---
+from config import BERT_MODEL, CLASSIFICATION_CACHE_SIZE, CLASSIFICATION_CACHE_PATH
+from config import BERT_BACKEND, BERT_BACKEND_TOLERANCE, BERT_ONNX_PATH, CLASSIFY_MAX_CHARS
+from config import GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH, GEMMA_MERGED_MODEL_PATH, GEMMA_CPU_MODE
+from config import GEMMA_PREFIX_CACHE, GEMMA_ASSISTANT_MODEL_ID, GEMMA_ASSISTANT_NUM_TOKENS
+from config import MAX_CONCURRENT_GENERATIONS, GENERATION_WORKERS, GENERATION_THREADS_PER_WORKER
+from config import REPLY_CACHE_SIZE, REPLY_SIMILARITY_THRESHOLD, REPLY_TEMPLATES_ENABLED, REPLY_TEMPLATES
+from config import CHECKPOINTER, CHECKPOINT_MAX_THREADS, CHECKPOINT_TTL_SECONDS, CHECKPOINT_SQLITE_PATH
+from reply_cache import ReplyCache
+from reply_templates import ReplyTemplates
+from checkpointing import make_checkpointer
+from metrics import metrics
 
 #
-# --- (MOVED) Load models ONCE at startup for efficiency ---
-#
-print("--- LOADING MODELS (This happens once) ---")
-classifier = IntentClassifier(model_path=BERT_MODEL)
-print("--- INTENT CLASSIFIER LOADED ---")
-generator = EmailGenerator(GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH)
-print("Gemma Email Generator loaded.")
-print("--- MODELS LOADED ---")
-#
-# --- (END MOVED) ---
+# --- Models load lazily on first use (or via warmup()) ---
+# Importing this module no longer pulls in torch or loads any weights, so tools
+# that only need the graph definition start instantly.
 #
+_classifier = None
+_generator = None
+# Separate locks so the classifier can serve requests while Gemma is still loading
+_classifier_lock = threading.Lock()
+_generator_lock = threading.Lock()
+
+reply_cache = ReplyCache(REPLY_CACHE_SIZE, REPLY_SIMILARITY_THRESHOLD) if REPLY_CACHE_SIZE > 0 else None
+reply_templates = ReplyTemplates(REPLY_TEMPLATES) if REPLY_TEMPLATES_ENABLED else None
+
+
+def get_classifier():
+    """Returns the shared IntentClassifier, loading it on first use (thread-safe)."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                from intent_classify import IntentClassifier
+                print("--- LOADING INTENT CLASSIFIER ---")
+                _classifier = IntentClassifier(
+                    model_path=BERT_MODEL,
+                    cache_size=CLASSIFICATION_CACHE_SIZE,
+                    cache_path=CLASSIFICATION_CACHE_PATH,
+                    backend=BERT_BACKEND,
+                    onnx_path=BERT_ONNX_PATH,
+                    tolerance=BERT_BACKEND_TOLERANCE,
+                    max_input_chars=CLASSIFY_MAX_CHARS
+                )
+                print("--- INTENT CLASSIFIER LOADED ---")
+    return _classifier
+
+
+def get_generator():
+    """Returns the shared EmailGenerator, loading it on first use (thread-safe)."""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                print("--- LOADING GEMMA EMAIL GENERATOR ---")
+                generator_kwargs = dict(
+                    base_model_id=GEMMA_BASE_MODEL_ID,
+                    adapter_path=GEMMA_ADAPTER_PATH,
+                    merged_model_path=GEMMA_MERGED_MODEL_PATH,
+                    cpu_mode=GEMMA_CPU_MODE,
+                    use_prefix_cache=GEMMA_PREFIX_CACHE,
+                    assistant_model_id=GEMMA_ASSISTANT_MODEL_ID,
+                    num_assistant_tokens=GEMMA_ASSISTANT_NUM_TOKENS
+                )
+                if GENERATION_WORKERS > 1:
+                    # Same generate() interface, served by a pool of worker processes
+                    from generator_pool import GeneratorPool
+                    _generator = GeneratorPool(
+                        num_workers=GENERATION_WORKERS,
+                        threads_per_worker=GENERATION_THREADS_PER_WORKER,
+                        **generator_kwargs
+                    )
+                else:
+                    from reply_generator import EmailGenerator
+                    _generator = EmailGenerator(**generator_kwargs)
+                print("Gemma Email Generator loaded.")
+    return _generator
+
+
+def set_models(classifier=None, generator=None):
+    """Injects already-built model objects (e.g. fakes or tiny test models) as the shared ones."""
+    global _classifier, _generator
+    with _classifier_lock, _generator_lock:
+        if classifier is not None:
+            _classifier = classifier
+        if generator is not None:
+            _generator = generator
+
+
+def warmup():
+    """Loads both models now instead of on the first email."""
+    print("--- LOADING MODELS (This happens once) ---")
+    get_classifier()
+    get_generator()
+    print("--- MODELS LOADED ---")
+
+
+def preload_in_background() -> threading.Thread:
+    """Starts warmup() on a daemon thread so loading overlaps with other startup work."""
+    thread = threading.Thread(target=warmup, name="model-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def shutdown():
+    """Stops the generator worker processes, if the shared generator is a GeneratorPool."""
+    from generator_pool import GeneratorPool
+
+    global _generator
+    with _generator_lock:
+        generator, _generator = _generator, None
+    if isinstance(generator, GeneratorPool):
+        generator.close()
 
 
 # --- 1. Define the State ---
@@ -32,6 +132,7 @@ class GraphState(TypedDict):
     original_subject: str
     email_content: str
     intent: str
+    confidence: float   # Classifier confidence for the intent (None if unknown)
     task_details: dict
     draft_email: str
     reply_subject: str  # New field for the reply subject
@@ -39,14 +140,19 @@ class GraphState(TypedDict):
 
 # --- 2. Define The Nodes ---
 
-def classify_intent(state: GraphState) -> GraphState:
+def classify_intent(state: GraphState, classifier=None) -> GraphState:
     print("---CLASSIFYING EMAIL INTENT---")
+    # Intent may already be set when the email was classified as part of a batch
+    if state.get("intent"):
+        print(f"Intent found (batched): {state['intent']}")
+        return {"intent": state["intent"], "confidence": state.get("confidence")}
     email = state["email_content"]
-    # Use the globally loaded classifier (This will work now)
-    prediction = classifier.predict(email)
+    # Use the injected classifier, or the shared lazily loaded one
+    prediction = (classifier or get_classifier()).predict(email)
     intent = prediction['label'] # Get the label from the dictionary
+    metrics.inc("emails_classified_total", intent=intent)
     print(f"Intent found: {intent}")
-    return {"intent": intent}
+    return {"intent": intent, "confidence": prediction['confidence']}
 
 
 def handle_merger(state: GraphState) -> GraphState:
@@ -77,15 +183,40 @@ def handle_fallback(state: GraphState) -> GraphState:
     return {"task_details": details}
 
 
-def generate_response(state: GraphState) -> GraphState:
+def fill_template(state: GraphState) -> GraphState:
+    """Answers routine, confidently classified emails from a template (no Gemma call)."""
+    if reply_templates is None:
+        return {}
+    fields = dict(state["task_details"], sender_email=state["sender_email"],
+                  original_subject=state["original_subject"])
+    reply_body = reply_templates.render(state["intent"], state.get("confidence"), fields)
+    metrics.inc("template_lookups_total", result="miss" if reply_body is None else "hit")
+    if reply_body is None:
+        return {}
+    print("---ANSWERED FROM TEMPLATE---")
+    return {"draft_email": reply_body, "reply_subject": f"Re: {state['original_subject']}"}
+
+
+def generate_response(state: GraphState, generator=None) -> GraphState:
     # ... (no changes here) ...
     print("---GENERATING DRAFT EMAIL---")
     intent = state["intent"]
     details = state["task_details"]
     original_subject = state["original_subject"]
 
-    # Use the globally loaded generator (This will work now)
-    reply_body = generator.generate(intent=intent, details=json.dumps(details))
+    details_json = json.dumps(details, sort_keys=True)
+
+    # Mass emails with the same intent/details reuse an earlier draft instead of calling Gemma
+    reply_body = reply_cache.lookup(intent, details_json, state["email_content"]) if reply_cache else None
+    if reply_cache:
+        metrics.inc("reply_cache_lookups_total", result="miss" if reply_body is None else "hit")
+    if reply_body is not None:
+        print("Reusing draft generated for a near-identical email.")
+    else:
+        # Use the injected generator, or the shared lazily loaded one
+        reply_body = (generator or get_generator()).generate(intent=intent, details=json.dumps(details))
+        if reply_cache:
+            reply_cache.store(intent, details_json, state["email_content"], reply_body)
     
     reply_subject = f"Re: {original_subject}"
     
@@ -105,44 +236,191 @@ def route_after_classification(state: GraphState) -> str:
     else:
         return "handle_fallback"
 
-workflow = StateGraph(GraphState)
-workflow.add_node("classify_intent", classify_intent)
-workflow.add_node("handle_merger", handle_merger)
-workflow.add_node("handle_sustainability", handle_sustainability)
-workflow.add_node("handle_fallback", handle_fallback)
-workflow.add_node("generate_response", generate_response)
-workflow.set_entry_point("classify_intent")
-workflow.add_conditional_edges(
-    "classify_intent",
-    route_after_classification,
-    {
-        "handle_merger": "handle_merger",
-        "handle_sustainability": "handle_sustainability",
-        "handle_fallback": "handle_fallback",
-    },
+def route_after_template(state: GraphState) -> str:
+    return END if state.get("draft_email") else "generate_response"
+
+def build_workflow(classifier=None, generator=None, asynchronous: bool = False) -> StateGraph:
+    """
+    Builds the email graph.
+
+    Args:
+        classifier: Optional IntentClassifier-like object; defaults to the shared lazy one.
+        generator: Optional EmailGenerator-like object; defaults to the shared lazy one.
+        asynchronous (bool): Use async model nodes (for ainvoke) instead of blocking ones.
+    """
+    if asynchronous:
+        classify_node = functools.partial(aclassify_intent, classifier=classifier)
+        generate_node = functools.partial(agenerate_response, generator=generator)
+    else:
+        classify_node = functools.partial(classify_intent, classifier=classifier)
+        generate_node = functools.partial(generate_response, generator=generator)
+
+    workflow = StateGraph(GraphState)
+    nodes = {
+        "classify_intent": classify_node,
+        "handle_merger": handle_merger,
+        "handle_sustainability": handle_sustainability,
+        "handle_fallback": handle_fallback,
+        "fill_template": fill_template,
+        "generate_response": generate_node,
+    }
+    for name, node in nodes.items():
+        # Times every node run (returns the node unchanged when metrics are disabled)
+        workflow.add_node(name, metrics.instrument(node, "graph_node_seconds", node=name))
+    workflow.set_entry_point("classify_intent")
+    workflow.add_conditional_edges(
+        "classify_intent",
+        route_after_classification,
+        {
+            "handle_merger": "handle_merger",
+            "handle_sustainability": "handle_sustainability",
+            "handle_fallback": "handle_fallback",
+        },
+    )
+    workflow.add_edge("handle_merger", "fill_template")
+    workflow.add_edge("handle_sustainability", "fill_template")
+    workflow.add_edge("handle_fallback", "fill_template")
+    # Template hits are finished; everything else is generated by Gemma
+    workflow.add_conditional_edges(
+        "fill_template",
+        route_after_template,
+        {END: END, "generate_response": "generate_response"},
+    )
+    workflow.add_edge("generate_response", END)
+    return workflow
+
+
+# --- 3b. Async Nodes ---
+# Model calls are offloaded to a thread pool so the event loop stays free,
+# and a semaphore bounds how many Gemma generations run at the same time.
+_model_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_GENERATIONS + 1, thread_name_prefix="model")
+_generation_semaphores = weakref.WeakKeyDictionary()
+
+
+def _generation_semaphore() -> asyncio.Semaphore:
+    # asyncio primitives belong to one event loop, so keep one per running loop
+    loop = asyncio.get_running_loop()
+    if loop not in _generation_semaphores:
+        _generation_semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+    return _generation_semaphores[loop]
+
+
+async def aclassify_intent(state: GraphState, classifier=None) -> GraphState:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_model_executor, classify_intent, state, classifier)
+
+
+async def agenerate_response(state: GraphState, generator=None) -> GraphState:
+    async with _generation_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_model_executor, generate_response, state, generator)
+
+
+# Compiling is cheap: the nodes resolve their models only when they run.
+# Every run gets a fresh thread_id, so the checkpointer must evict old runs to keep RSS flat.
+memory = make_checkpointer(
+    CHECKPOINTER,
+    max_threads=CHECKPOINT_MAX_THREADS,
+    ttl_seconds=CHECKPOINT_TTL_SECONDS,
+    sqlite_path=CHECKPOINT_SQLITE_PATH
 )
-workflow.add_edge("handle_merger", "generate_response")
-workflow.add_edge("handle_sustainability", "generate_response")
-workflow.add_edge("handle_fallback", "generate_response")
-workflow.add_edge("generate_response", END)
-memory = MemorySaver()
+workflow = build_workflow()
 app = workflow.compile(checkpointer=memory)
+async_app = build_workflow(asynchronous=True).compile(checkpointer=memory)
+
 
-print("--- LANGGRAPH WORKFLOW COMPILED (FULLY AUTOMATED) ---")
+# --- 4. Create Helper Functions ---
+def classify_emails(email_contents: List[str], batch_size: int = 32, with_confidence: bool = False) -> list:
+    """
+    Classifies several waiting emails in length-bucketed batches.
+    Returns one intent label per email, in the same order
+    ((label, confidence) pairs with with_confidence=True).
+    """
+    with metrics.timer("classifier_batch_seconds"):
+        predictions = get_classifier().predict_batch(email_contents, batch_size=batch_size)
+    for prediction in predictions:
+        metrics.inc("emails_classified_total", intent=prediction['label'])
+    if with_confidence:
+        return [(prediction['label'], prediction['confidence']) for prediction in predictions]
+    return [prediction['label'] for prediction in predictions]
 
 
-# --- 4. Create a Helper Function ---
-def run_workflow(email_content: str, sender_email: str, subject: str) -> dict:
+def run_workflow(email_content: str, sender_email: str, subject: str, intent: Optional[str] = None,
+                 confidence: Optional[float] = None) -> dict:
     """
     Runs the full LangGraph workflow for a single email.
     Returns a dictionary with the final reply subject and body.
-    (Models are already loaded globally)
+    (Models are loaded on first use, see warmup())
+    If `intent` is given (e.g. from classify_emails), classification is skipped;
+    pass its `confidence` too so the email can still be answered from a template.
     """
 
-    #
-    # --- (REMOVED) Model loading was moved to the top of the file ---
-    #
+    # Run the graph from start to finish
+    final_state = app.invoke(*_workflow_inputs(email_content, sender_email, subject, intent, confidence))
     
+    # Return the generated reply
+    return _to_reply(final_state, subject)
+
+
+async def arun_workflow(email_content: str, sender_email: str, subject: str, intent: Optional[str] = None,
+                        confidence: Optional[float] = None) -> dict:
+    """
+    Async version of run_workflow built on app.ainvoke.
+    Many emails can be in flight at once (e.g. with asyncio.gather); model calls run
+    in a thread pool and at most MAX_CONCURRENT_GENERATIONS generations run together.
+    """
+    final_state = await async_app.ainvoke(*_workflow_inputs(email_content, sender_email, subject, intent, confidence))
+    return _to_reply(final_state, subject)
+
+
+_HANDLERS = {
+    "handle_merger": handle_merger,
+    "handle_sustainability": handle_sustainability,
+    "handle_fallback": handle_fallback,
+}
+
+
+def draft_replies(emails: List[dict], batch_size: int = 8) -> List[dict]:
+    """
+    Drafts replies for many already classified emails at once (offline / bulk use).
+
+    Each email dict has email_content, sender_email, subject, intent and optionally
+    confidence. The same handler, template and reply-cache steps as the graph run per
+    email; everything still needing Gemma is then generated with generate_batch
+    instead of one generate() call per email. Returns one reply dict per email, in order.
+    """
+    states, pending = [], []
+    for email in emails:
+        state = {
+            "email_content": email["email_content"],
+            "sender_email": email["sender_email"],
+            "original_subject": email["subject"],
+            "intent": email["intent"],
+            "confidence": email.get("confidence"),
+        }
+        state.update(_HANDLERS[route_after_classification(state)](state))
+        state.update(fill_template(state))
+        if not state.get("draft_email"):
+            details_json = json.dumps(state["task_details"], sort_keys=True)
+            reply_body = reply_cache.lookup(state["intent"], details_json, state["email_content"]) if reply_cache else None
+            if reply_body is None:
+                pending.append(state)
+            else:
+                state["draft_email"] = reply_body
+        states.append(state)
+
+    if pending:
+        requests = [(state["intent"], json.dumps(state["task_details"])) for state in pending]
+        for state, reply_body in zip(pending, get_generator().generate_batch(requests, batch_size=batch_size)):
+            state["draft_email"] = reply_body
+            if reply_cache:
+                reply_cache.store(state["intent"], json.dumps(state["task_details"], sort_keys=True),
+                                  state["email_content"], reply_body)
+    return [_to_reply(state, state["original_subject"]) for state in states]
+
+
+def _workflow_inputs(email_content: str, sender_email: str, subject: str, intent: Optional[str],
+                     confidence: Optional[float] = None):
     # Use a unique thread_id for each run to keep states separate
     thread_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
@@ -152,12 +430,14 @@ def run_workflow(email_content: str, sender_email: str, subject: str) -> dict:
         "sender_email": sender_email,
         "original_subject": subject,
     }
-    
-    # Run the graph from start to finish
-    final_state = app.invoke(initial_state, config=config)
-    
-    # Return the generated reply
+    if intent:
+        initial_state["intent"] = intent
+        initial_state["confidence"] = confidence
+    return initial_state, config
+
+
+def _to_reply(final_state: dict, subject: str) -> dict:
     return {
         "reply_subject": final_state.get("reply_subject", f"Re: {subject}"),
         "reply_body": final_state.get("draft_email", "Error: Could not generate a reply.")
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,19 @@
+"""
+Build step: merge the fine-tuned LoRA adapters into the Gemma base model and save
+a standalone checkpoint to config.GEMMA_MERGED_MODEL_PATH.
+
+    python merge_adapters.py [--output ./gemma_2b_merged]
+"""
+import argparse
+
+from config import GEMMA_BASE_MODEL_ID, GEMMA_ADAPTER_PATH, GEMMA_MERGED_MODEL_PATH
+from reply_generator import merge_adapters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default=GEMMA_BASE_MODEL_ID)
+    parser.add_argument("--adapter", default=GEMMA_ADAPTER_PATH)
+    parser.add_argument("--output", default=GEMMA_MERGED_MODEL_PATH)
+    args = parser.parse_args()
+
+    merge_adapters(args.base, args.adapter, args.output)
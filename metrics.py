@@ -0,0 +1,257 @@
+import bisect
+import contextlib
+import functools
+import inspect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# Upper bounds (seconds) shared by every latency histogram: Gmail calls and BERT sit
+# in the millisecond range, Gemma generations in the tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Buckets for generation throughput (tokens per second)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and latency histograms rendered in the Prometheus text format.
+
+    When disabled every recording call returns immediately and instrument() hands
+    back the original function, so the hot path pays nothing beyond one attribute
+    check. Gauges can also be registered as callbacks (e.g. pipeline queue depths),
+    which are only evaluated when the metrics are rendered.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._counters = {}     # (name, labels) -> value
+        self._gauges = {}       # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> _Histogram
+        self._callbacks = {}    # name -> (label name, callback)
+        self._help = {}
+        self._lock = threading.Lock()
+
+    # --- Recording ---
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """Context manager observing the elapsed seconds of its block into histogram `name`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed_block(name, labels)
+
+    @contextlib.contextmanager
+    def _timed_block(self, name, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge_callback(self, name: str, callback: Callable[[], dict], label: str = "name") -> None:
+        """Registers a gauge whose values come from callback() -> {label value: number} at render time."""
+        self._callbacks[name] = (label, callback)
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def instrument(self, func: Callable, name: str, **labels) -> Callable:
+        """
+        Wraps `func` (sync or async) so each call is timed into histogram `name`
+        and failures are counted in `<name>_errors_total`. Returns `func` itself when disabled.
+        """
+        if not self.enabled:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception:
+                        self.inc(f"{name}_errors_total", **labels)
+                        raise
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception:
+                        self.inc(f"{name}_errors_total", **labels)
+                        raise
+        return wrapper
+
+    # --- Export ---
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = [(key, list(h.counts), h.sum, h.count, h.buckets)
+                          for key, h in sorted(self._histograms.items(), key=lambda item: item[0])]
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, (label, callback) in sorted(self._callbacks.items()):
+            header(name, "gauge")
+            for label_value, value in callback().items():
+                lines.append(f"{name}{_format_labels(((label, label_value),))} {value}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Writes the metrics to `path` atomically (for node_exporter's textfile collector)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serves GET /metrics on a daemon thread and returns the server."""
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def write_periodically(self, path: str, interval: float = 15) -> threading.Thread:
+        """Rewrites the metrics file every `interval` seconds on a daemon thread."""
+        def _loop():
+            while True:
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"Could not write metrics to {path}: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=_loop, name="metrics-file", daemon=True)
+        thread.start()
+        return thread
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _make_registry() -> MetricsRegistry:
+    from config import METRICS_ENABLED
+    registry = MetricsRegistry(enabled=METRICS_ENABLED)
+    registry.describe("graph_node_seconds", "Time spent in each LangGraph node")
+    registry.describe("gmail_request_seconds", "Latency of Gmail API calls")
+    registry.describe("classifier_batch_seconds", "Latency of batched intent classification")
+    registry.describe("gemma_generate_seconds", "Latency of a Gemma generate() call")
+    registry.describe("gemma_prompt_tokens_total", "Prompt tokens processed by Gemma")
+    registry.describe("gemma_generated_tokens_total", "Tokens generated by Gemma")
+    registry.describe("gemma_tokens_per_second", "Generation throughput per call")
+    registry.describe("pipeline_queue_depth", "Emails waiting in front of each pipeline stage")
+    registry.describe("journal_messages", "Messages in the work journal, by state")
+    registry.describe("emails_classified_total", "Emails classified, by intent")
+    registry.describe("reply_cache_lookups_total", "Draft reuse lookups, by result")
+    registry.describe("template_lookups_total", "Template fast path lookups, by result")
+    registry.describe("gmail_errors_total", "Gmail calls that failed, by call")
+    registry.describe("gmail_batch_retries_total", "Messages re-sent after a retryable batch error")
+    return registry
+
+
+# Shared registry used by the service modules
+metrics = _make_registry()
+
+
+def start_exporter(registry: MetricsRegistry = metrics, port: Optional[int] = None,
+                   file_path: Optional[str] = None, interval: float = 15) -> None:
+    """Starts the HTTP and/or file exporter for an enabled registry (no-op when disabled)."""
+    if not registry.enabled:
+        return
+    if port:
+        registry.serve(port)
+        print(f"Metrics available at http://localhost:{port}/metrics")
+    if file_path:
+        registry.write_periodically(file_path, interval)
+        print(f"Writing metrics to {file_path} every {interval}s")
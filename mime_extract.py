@@ -0,0 +1,162 @@
+"""
+Bounded text extraction from Gmail message payloads.
+
+Walks nested multipart trees (multipart/mixed -> multipart/alternative -> ...),
+prefers text/plain, falls back to a cheap HTML-to-text conversion, skips
+attachments without decoding them, and strips quoted reply chains and signatures.
+Only the first `max_chars` worth of each body is base64-decoded, so a 20 MB email
+costs about as much as a short one.
+"""
+import base64
+import html
+import re
+from typing import Iterator, Optional
+
+# Never walk more parts than this (guards against pathological MIME trees)
+MAX_PARTS = 200
+
+# HTML carries markup around the text, so decode more of it for the same text budget
+HTML_BYTES_PER_CHAR = 4
+
+_HTML_DROP = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_BREAK = re.compile(r"<(br|/p|/div|/tr|/li|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]*>")
+_HTML_QUOTE = re.compile(r"<blockquote\b.*?</blockquote\s*>", re.IGNORECASE | re.DOTALL)
+
+# Lines that start a quoted earlier message; everything from them on is dropped
+_REPLY_HEADERS = [
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^_{10,}\s*$"),  # Outlook's separator line
+]
+# Gmail's attribution line; long ones are wrapped over up to ATTRIBUTION_MAX_LINES lines
+_ATTRIBUTION = re.compile(r"^On .{1,200}wrote:\s*$")
+ATTRIBUTION_MAX_LINES = 3
+# "From:" only starts a quote as the first line of a header block (From:/Sent:/To: ...)
+_QUOTED_FROM = re.compile(r"^From:\s.+$")
+_QUOTED_HEADER = re.compile(r"^(Sent|Date|To|Cc|Subject):\s", re.IGNORECASE)
+# Lines that start a signature
+_SIGNATURE_MARKERS = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^Sent from my \w+", re.IGNORECASE),
+]
+
+
+def iter_parts(payload: dict) -> Iterator[dict]:
+    """Yields the leaf parts of a (possibly nested) payload in document order."""
+    stack = [payload]
+    visited = 0
+    while stack and visited < MAX_PARTS:
+        part = stack.pop()
+        visited += 1
+        children = part.get("parts")
+        if children:
+            stack.extend(reversed(children))
+        else:
+            yield part
+
+
+def is_attachment(part: dict) -> bool:
+    """True for parts that are files rather than message text (never decoded)."""
+    if part.get("filename") or part.get("body", {}).get("attachmentId"):
+        return True
+    for header in part.get("headers", []):
+        if header.get("name", "").lower() == "content-disposition" \
+                and header.get("value", "").lower().startswith("attachment"):
+            return True
+    return False
+
+
+def decode_prefix(data: str, max_bytes: Optional[int] = None) -> str:
+    """Base64url-decodes at most the first `max_bytes` bytes of `data` as UTF-8."""
+    if max_bytes is not None:
+        # 4 base64 characters encode 3 bytes; stop on a 4-character boundary
+        data = data[:(max_bytes + 2) // 3 * 4]
+    data = data.rstrip("=")
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    if max_bytes is not None:
+        raw = raw[:max_bytes]
+    # A cut may split a multi-byte character at the end
+    return raw.decode("utf-8", errors="ignore")
+
+
+def html_to_text(markup: str) -> str:
+    """Cheap HTML to plain text: drops scripts/styles/quotes, keeps line breaks, unescapes entities."""
+    markup = _HTML_DROP.sub(" ", markup)
+    markup = _HTML_QUOTE.sub(" ", markup)
+    markup = _HTML_BREAK.sub("\n", markup)
+    text = html.unescape(_HTML_TAG.sub(" ", markup))
+    lines = (re.sub(r"[ \t\xa0]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def strip_quotes_and_signature(text: str) -> str:
+    """Removes quoted earlier messages ('>' lines, 'On ... wrote:' and below) and the signature."""
+    lines = text.splitlines()
+    kept = []
+    for index, line in enumerate(lines):
+        if _starts_quote_or_signature(lines, index):
+            break
+        if line.strip().startswith(">"):
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def _starts_quote_or_signature(lines, index):
+    stripped = lines[index].strip()
+    if any(pattern.match(stripped) for pattern in _REPLY_HEADERS + _SIGNATURE_MARKERS):
+        return True
+    if stripped.startswith("On "):
+        # Join a wrapped attribution line ("On ... Some Long Name <" / "x@y.com> wrote:")
+        joined = ""
+        for line in lines[index:index + ATTRIBUTION_MAX_LINES]:
+            joined = f"{joined} {line.strip()}".lstrip()
+            if _ATTRIBUTION.match(joined):
+                return True
+    if _QUOTED_FROM.match(stripped):
+        following = next((line.strip() for line in lines[index + 1:] if line.strip()), "")
+        return bool(_QUOTED_HEADER.match(following))
+    return False
+
+
+def extract_body(payload: dict, max_chars: Optional[int] = None, strip_quotes: bool = True) -> str:
+    """
+    Returns the readable text of a Gmail payload, at most `max_chars` characters.
+
+    text/plain parts are preferred over text/html; attachments are skipped.
+    Only the first `max_chars` characters' worth of the chosen part is decoded.
+    """
+    plain, html_part = None, None
+    for part in iter_parts(payload):
+        if is_attachment(part) or not part.get("body", {}).get("data"):
+            continue
+        mime_type = part.get("mimeType", "").lower()
+        if mime_type == "text/plain" and plain is None:
+            plain = part
+            break
+        if mime_type == "text/html" and html_part is None:
+            html_part = part
+
+    # UTF-8 needs up to 4 bytes per character
+    if plain is not None:
+        text = decode_prefix(plain["body"]["data"], max_chars * 4 if max_chars else None)
+    elif html_part is not None:
+        max_bytes = max_chars * 4 * HTML_BYTES_PER_CHAR if max_chars else None
+        text = html_to_text(decode_prefix(html_part["body"]["data"], max_bytes))
+    else:
+        return ""
+
+    if strip_quotes:
+        stripped = strip_quotes_and_signature(text)
+        # An email that is nothing but a forward keeps its text
+        text = stripped or text
+    return clip(text, max_chars)
+
+
+def clip(text: str, max_chars: Optional[int]) -> str:
+    """Cuts text to `max_chars`, at the last whitespace when one is close to the limit."""
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", max_chars - 50, max_chars)
+    return text[:cut if cut > 0 else max_chars]
@@ -0,0 +1,188 @@
+import queue
+import threading
+
+# Marks the end of a stage's input; one is sent per downstream worker
+_STOP = object()
+
+
+class _Stage:
+    """A pool of worker threads reading from one bounded queue and feeding the next."""
+
+    def __init__(self, name, workers, in_queue, process, out_stage=None):
+        self.name = name
+        self.in_queue = in_queue
+        self.process = process
+        self.out_stage = out_stage
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._alive = workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _STOP:
+                break
+            try:
+                for result in self.process(item):
+                    # Blocks while the next stage is full (backpressure)
+                    self.out_stage.in_queue.put(result)
+            except Exception as e:
+                print(f"\nAn error occurred in the {self.name} stage: {e}")
+
+        # The last worker to finish passes the shutdown on, after all of its output
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.out_stage is not None:
+            for _ in self.out_stage.threads:
+                self.out_stage.in_queue.put(_STOP)
+
+
+class MailPipeline:
+    """
+    Runs fetch -> classify -> generate -> send as concurrent stages joined by bounded queues.
+
+    Fetching and sending run on I/O threads, classification and generation on compute
+    workers (PyTorch releases the GIL inside forward passes), so Gmail round trips
+    overlap with model time instead of adding to it. A full queue blocks the stage
+    feeding it, which keeps memory bounded when generation falls behind.
+
+    stop() stops fetching and then lets every email already fetched flow through all
+    remaining stages before the workers exit, so no in-flight mail is lost.
+    """
+    def __init__(self, fetch_fn, classify_fn, generate_fn, send_fn,
+                 poll_interval=30, queue_size=64,
+                 classify_workers=1, generate_workers=1, send_workers=2,
+                 classify_batch_size=32, send_batch_size=1, scheduler=None):
+        """
+        Args:
+            fetch_fn: () -> list of email dicts. Called once per polling cycle.
+            classify_fn: (list of email dicts) -> list of intents, one per email.
+            generate_fn: (email dict, intent) -> reply dict with reply_subject/reply_body.
+            send_fn: (list of (email dict, reply dict)) -> None. Sends the replies and marks
+                the emails read. Gets several pairs at once when send_batch_size > 1.
+            poll_interval (float): Seconds between fetches (ignored when a scheduler is given).
+            queue_size (int): Capacity of each inter-stage queue.
+            classify_workers / generate_workers / send_workers (int): Worker threads per stage.
+            classify_batch_size (int): Max queued emails classified together in one call.
+            send_batch_size (int): Max queued replies handed to send_fn together.
+            scheduler: Optional PollScheduler that picks the delay after each fetch from
+                its outcome (mail found, idle, or the error fetch_fn raised).
+        """
+        self.fetch_fn = fetch_fn
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler
+        self.classify_batch_size = classify_batch_size
+        self.send_batch_size = send_batch_size
+        self._classify_fn = classify_fn
+        self._generate_fn = generate_fn
+        self._send_fn = send_fn
+        self._stop_event = threading.Event()
+        self.processed = 0
+        self._processed_lock = threading.Lock()
+
+        # Build the stages back to front so each knows where its output goes
+        self.send_stage = _Stage("send", send_workers, queue.Queue(queue_size), self._send)
+        self.generate_stage = _Stage("generate", generate_workers, queue.Queue(queue_size),
+                                     self._generate, self.send_stage)
+        self.classify_stage = _Stage("classify", classify_workers, queue.Queue(queue_size),
+                                     self._classify, self.generate_stage)
+        self.fetch_thread = threading.Thread(target=self._fetch_loop, name="fetch", daemon=True)
+
+    # --- Lifecycle ---
+    def start(self):
+        for stage in (self.send_stage, self.generate_stage, self.classify_stage):
+            stage.start()
+        self.fetch_thread.start()
+
+    def stop(self):
+        """Stops fetching, then waits until every fetched email has been sent."""
+        self._stop_event.set()
+        self.fetch_thread.join()
+        for stage in (self.classify_stage, self.generate_stage, self.send_stage):
+            stage.join()
+
+    def enqueue(self, classify=(), generate=(), send=()):
+        """
+        Feeds work directly into a stage (e.g. messages resumed from a WorkJournal):
+        emails to classify, (email, classify_fn result) pairs to generate, (email, reply) pairs to send.
+        Call after start(), since full queues block until the stages make room.
+        """
+        for email in classify:
+            self.classify_stage.in_queue.put(email)
+        for item in generate:
+            self.generate_stage.in_queue.put(item)
+        for item in send:
+            self.send_stage.in_queue.put(item)
+
+    def queue_depths(self):
+        """Current number of emails waiting in front of each stage."""
+        return {
+            "classify": self.classify_stage.in_queue.qsize(),
+            "generate": self.generate_stage.in_queue.qsize(),
+            "send": self.send_stage.in_queue.qsize(),
+        }
+
+    # --- Stages ---
+    def _fetch_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                emails = self.fetch_fn()
+                if emails:
+                    print(f"\n--- Found {len(emails)} new email(s)! ---")
+                for email in emails:
+                    self.classify_stage.in_queue.put(email)
+                delay = self.scheduler.on_success(len(emails)) if self.scheduler else self.poll_interval
+            except Exception as e:
+                print(f"\nAn error occurred while fetching: {e}")
+                delay = self.scheduler.on_error(e) if self.scheduler else self.poll_interval
+            self._stop_event.wait(delay)
+
+        for _ in self.classify_stage.threads:
+            self.classify_stage.in_queue.put(_STOP)
+
+    def _classify(self, email):
+        # Classify whatever else is already waiting together with this email
+        batch = self._drain(self.classify_stage, email, self.classify_batch_size)
+        intents = self._classify_fn(batch)
+        return list(zip(batch, intents))
+
+    def _generate(self, item):
+        email, intent = item
+        reply = self._generate_fn(email, intent)
+        return [(email, reply)]
+
+    def _send(self, item):
+        # Replies that are ready at the same time go out together
+        batch = self._drain(self.send_stage, item, self.send_batch_size)
+        self._send_fn(batch)
+        with self._processed_lock:
+            self.processed += len(batch)
+        return []
+
+    @staticmethod
+    def _drain(stage, first, limit):
+        """Returns `first` plus up to limit - 1 items already waiting in the stage's queue."""
+        batch = [first]
+        while len(batch) < limit:
+            try:
+                item = stage.in_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Put it back so this worker still sees it after the batch
+                stage.in_queue.put(item)
+                break
+            batch.append(item)
+        return batch
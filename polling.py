@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+from typing import Optional
+
+# Gmail API quota units per call (https://developers.google.com/gmail/api/reference/quota)
+GMAIL_QUOTA_UNITS = {
+    "users.getProfile": 1,
+    "users.messages.list": 5,
+    "users.messages.get": 5,
+    "users.messages.modify": 5,
+    "users.messages.batchModify": 50,
+    "users.messages.send": 100,
+    "users.history.list": 2,
+}
+
+# Gmail's per-user rate limit (quota units per second, as a moving average)
+GMAIL_USER_UNITS_PER_SECOND = 250
+
+# Sub-resources of the service object that MeteredService keeps wrapping
+_RESOURCES = ("users", "messages", "history")
+
+
+class QuotaTracker:
+    """
+    Per-account quota accounting with a token bucket of `units_per_second`.
+
+    charge() records units as they are spent; wait_time() says how long an account
+    must pause before its average is back under the limit.
+    """
+    def __init__(self, units_per_second: float = GMAIL_USER_UNITS_PER_SECOND, clock=time.monotonic):
+        self.units_per_second = units_per_second
+        self._clock = clock
+        self._buckets = {}   # account -> (tokens, last update)
+        self._totals = {}    # account -> units spent since start
+        self._lock = threading.Lock()
+
+    def charge(self, units: float, account: str = "me") -> None:
+        with self._lock:
+            tokens = self._refill(account) - units
+            self._buckets[account] = (tokens, self._clock())
+            self._totals[account] = self._totals.get(account, 0) + units
+
+    def wait_time(self, account: str = "me") -> float:
+        """Seconds until the account may spend again without exceeding the rate limit."""
+        with self._lock:
+            tokens = self._refill(account)
+        return max(0.0, -tokens / self.units_per_second)
+
+    def totals(self) -> dict:
+        """Units spent per account since start."""
+        with self._lock:
+            return dict(self._totals)
+
+    def _refill(self, account):
+        # Caller holds the lock
+        now = self._clock()
+        tokens, updated = self._buckets.get(account, (self.units_per_second, now))
+        tokens = min(self.units_per_second, tokens + (now - updated) * self.units_per_second)
+        self._buckets[account] = (tokens, now)
+        return tokens
+
+
+class MeteredService:
+    """
+    Wraps a Gmail service object and charges every API call to a QuotaTracker.
+
+    Calls are charged when the request is built, so requests added to a batch are
+    counted too. Requests and batches themselves are returned unwrapped.
+    """
+    def __init__(self, service, quota: QuotaTracker, account: str = "me", _path: str = ""):
+        self._service = service
+        self._quota = quota
+        self._account = account
+        self._path = _path
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service, name)
+        if not callable(attribute):
+            return attribute
+        path = f"{self._path}.{name}" if self._path else name
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if path in GMAIL_QUOTA_UNITS:
+                self._quota.charge(GMAIL_QUOTA_UNITS[path], self._account)
+            if name in _RESOURCES:
+                return MeteredService(result, self._quota, self._account, path)
+            return result
+        return call
+
+
+class PollScheduler:
+    """
+    Decides how long to wait before the next mailbox poll.
+
+    - A poll that found mail is followed immediately by the next one (burst mode).
+    - Idle polls back off exponentially from `min_interval` up to `max_interval`.
+    - Polls that fail with a rate-limit or server error (HTTP 429/5xx) back off
+      exponentially with jitter from `error_interval` up to `max_error_interval`;
+      a 429's Retry-After header is honoured. Other failures (e.g. bad credentials)
+      are not helped by hammering or by backing off, so they keep the idle cadence.
+    - The delay never ends before the account's Gmail quota allows another call.
+
+    Randomness goes through `rng` and time only through the QuotaTracker's clock, so
+    decisions can be checked deterministically.
+    """
+    def __init__(self, min_interval: float = 5, max_interval: float = 120, backoff: float = 2.0,
+                 error_interval: float = 1, max_error_interval: float = 300,
+                 quota: Optional[QuotaTracker] = None, account: str = "me",
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            min_interval (float): Delay after the first idle poll.
+            max_interval (float): Ceiling for the idle backoff.
+            backoff (float): Multiplier applied per consecutive idle or failed poll.
+            error_interval (float): Base delay after the first failed poll.
+            max_error_interval (float): Ceiling for the error backoff.
+            quota (QuotaTracker, optional): Quota of the polled account.
+            account (str): Account name used with `quota`.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.error_interval = error_interval
+        self.max_error_interval = max_error_interval
+        self.quota = quota
+        self.account = account
+        self._rng = rng or random.Random()
+        self.idle_polls = 0
+        self.failed_polls = 0
+
+    def on_success(self, found: int) -> float:
+        """Records a completed poll that returned `found` emails; returns the delay before the next."""
+        self.failed_polls = 0
+        if found:
+            self.idle_polls = 0
+            return self._schedule(0.0)
+        return self._schedule(self._idle_delay())
+
+    def on_error(self, error: Exception) -> float:
+        """Records a failed poll; returns the delay before retrying."""
+        if not is_retryable(error):
+            self.failed_polls = 0
+            return self._schedule(self._idle_delay())
+
+        retry_after = _retry_after(error)
+        ceiling = min(self.max_error_interval, self.error_interval * self.backoff ** self.failed_polls)
+        self.failed_polls += 1
+        # "Equal jitter": at least half the backoff, so retries never hammer the API
+        delay = ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return self._schedule(delay)
+
+    def _idle_delay(self):
+        delay = min(self.max_interval, self.min_interval * self.backoff ** self.idle_polls)
+        self.idle_polls += 1
+        return delay
+
+    def _schedule(self, delay: float) -> float:
+        if self.quota is not None:
+            delay = max(delay, self.quota.wait_time(self.account))
+        return delay
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for HttpErrors that are worth retrying later: rate limits (429) and server errors (5xx)."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or 500 <= status < 600
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """The Retry-After seconds of a 429 HttpError, if it has one."""
+    resp = getattr(error, "resp", None)
+    if resp is None or str(getattr(resp, "status", "")) != "429":
+        return None
+    try:
+        return float(resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+
+from metrics import metrics
+from polling import is_retryable
+
+# users.messages.batchModify accepts at most 1000 message IDs per call
+BATCH_MODIFY_MAX_IDS = 1000
+
+# Network failures (timeouts, dropped connections, token refresh) that a later flush may get past
+_TRANSPORT_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
+
+class ReadMarker:
+    """
+    Collects processed message IDs and marks them read with messages.batchModify.
+
+    One batchModify call replaces one messages.modify round trip per email. IDs are
+    flushed once `flush_size` are waiting or the oldest has waited `flush_interval`
+    seconds, whichever comes first. All Gmail calls happen on the marker's own
+    thread, so add() never blocks the caller on the network. IDs whose batch failed
+    with a network error, rate limit or server error are flushed again after
+    `flush_interval`; other API errors drop the batch.
+    """
+    def __init__(self, get_service, flush_size: int = 100, flush_interval: float = 5.0, on_marked=None):
+        """
+        Args:
+            get_service: () -> Gmail service object; called on the flush thread
+                (e.g. get_thread_gmail_service, since service objects are not thread-safe).
+            flush_size (int): Pending IDs that trigger an immediate flush.
+            flush_interval (float): Maximum seconds an ID waits before being flushed.
+            on_marked: Optional (list of message IDs) -> None, called after each successful batch.
+        """
+        self._get_service = get_service
+        self.flush_size = min(flush_size, BATCH_MODIFY_MAX_IDS)
+        self.flush_interval = flush_interval
+        self._on_marked = on_marked
+        self.marked = 0
+        self._pending = []
+        self._oldest = None
+        self._retry_at = 0.0  # After a failed flush, nothing is flushed again before this
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="read-marker", daemon=True)
+        self._thread.start()
+
+    def add(self, msg_id: str) -> None:
+        """Queues a message to be marked as read."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("ReadMarker is closed")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(msg_id)
+            if len(self._pending) >= self.flush_size:
+                self._condition.notify()
+
+    def flush(self) -> None:
+        """Marks everything pending as read now, on the calling thread."""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._flush(batch)
+
+    def close(self) -> None:
+        """
+        Flushes everything still pending and stops the flush thread. IDs that still fail
+        stay unread (the work journal acknowledges them after a restart).
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    if len(self._pending) >= self.flush_size and now >= self._retry_at:
+                        break
+                    if self._pending:
+                        remaining = max(self._oldest + self.flush_interval, self._retry_at) - now
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                batch, self._pending = self._pending, []
+                closed = self._closed
+
+            if batch:
+                self._flush(batch)
+            if closed:
+                return
+
+    def _flush(self, msg_ids):
+        for start in range(0, len(msg_ids), BATCH_MODIFY_MAX_IDS):
+            chunk = msg_ids[start:start + BATCH_MODIFY_MAX_IDS]
+            try:
+                service = self._get_service()
+                with metrics.timer("gmail_request_seconds", call="batch_modify"):
+                    service.users().messages().batchModify(
+                        userId='me',
+                        body={'ids': chunk, 'removeLabelIds': ['UNREAD']}
+                    ).execute()
+            except (HttpError, *_TRANSPORT_ERRORS) as error:
+                metrics.inc("gmail_errors_total", call="batch_modify")
+                if isinstance(error, HttpError) and not is_retryable(error):
+                    print(f'An error occurred while marking {len(chunk)} email(s) as read: {error}')
+                    continue
+                # Transient: this chunk and the rest go back in the queue for a later flush
+                self._requeue(msg_ids[start:])
+                print(f'Could not mark {len(msg_ids) - start} email(s) as read, retrying later: {error}')
+                return
+            self.marked += len(chunk)
+            if self._on_marked is not None:
+                self._on_marked(chunk)
+            print(f"Marked {len(chunk)} email(s) as read.")
+
+    def _requeue(self, msg_ids):
+        with self._condition:
+            self._pending = msg_ids + self._pending
+            self._oldest = time.monotonic()
+            self._retry_at = time.monotonic() + self.flush_interval
@@ -4,6 +4,8 @@ import json
 import time
 from email.mime.text import MIMEText
 import re
+import threading
+import weakref
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -12,22 +14,62 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 # from google import drive
 
-# --- IMPORT THE LANGGRAPH WORKFLOW ---
-from main_graph import run_workflow  # Import the helper function
+from mail_sync import MailboxSync, list_all_message_ids
+from pipeline import MailPipeline
+from fair_executor import FairExecutor
+from read_marker import ReadMarker
+from work_journal import WorkJournal
+from mime_extract import extract_body
+from polling import PollScheduler, QuotaTracker, MeteredService, is_retryable
+from metrics import metrics, start_exporter
+
 # from config import configg
 
 # === CONFIGURATION ===
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
-POLLING_INTERVAL_SECONDS = 30 
+# Adaptive polling: poll again at once after finding mail, back off while the inbox is idle
+POLL_MIN_INTERVAL_SECONDS = 5
+POLL_MAX_INTERVAL_SECONDS = 120
+POLL_BACKOFF_FACTOR = 2
+POLL_ERROR_BACKOFF_SECONDS = 1   # First retry after a failed poll (429/5xx), jittered
+POLL_MAX_ERROR_BACKOFF_SECONDS = 300
+BATCH_CHUNK_SIZE = 50           # Gmail recommends at most 50 calls per batch request
+BATCH_MAX_RETRIES = 3           # Retries for individual items that failed inside a batch
+BATCH_RETRY_BACKOFF_SECONDS = 1
+BODY_MAX_CHARS = 16384          # Only this much of each body is decoded (quotes/signatures removed)
+
+# Pipelined processing: bounded queues between stages and workers per stage
+PIPELINE_QUEUE_SIZE = 64
+PIPELINE_CLASSIFY_WORKERS = 1
+PIPELINE_GENERATE_WORKERS = 1   # Each worker shares the same loaded Gemma model
+PIPELINE_SEND_WORKERS = 2
+PIPELINE_SEND_BATCH_SIZE = 20   # Replies waiting together are sent in one batch request
+
+# Read-marking is collected into messages.batchModify calls
+READ_MARK_FLUSH_SIZE = 100
+READ_MARK_FLUSH_INTERVAL_SECONDS = 5
+
+# Crash-safe progress record for every message (resumed on restart)
+WORK_JOURNAL_PATH = 'work_journal.sqlite'
+WORK_JOURNAL_RETENTION_SECONDS = 7 * 24 * 3600   # Finished messages are kept this long
+
+# Multi-mailbox mode: every account shares one set of loaded models. Each entry is
+# {'name': ..., 'token_file': ..., 'journal_path': ...}; only 'name' is required
+# (defaults: token.<name>.json, work_journal.<name>.sqlite). Empty serves TOKEN_FILE alone.
+MAILBOX_ACCOUNTS = []
+MAILBOX_MAX_IN_FLIGHT = None    # Emails per mailbox in the models at once (None: up to every inference worker)
 
-# --- (get_gmail_service, mark_as_read, create_message, send_email functions remain the same) ---
-def get_gmail_service():
-    """Authenticates with the Gmail API and returns a service object."""
+# Gmail quota units spent by every service object this process builds
+gmail_quota = QuotaTracker()
+
+# --- (get_gmail_service, create_message, send_email functions remain the same) ---
+def get_gmail_service(token_file=TOKEN_FILE, account='me'):
+    """Authenticates with the Gmail API and returns a service object for the account in `token_file`."""
     creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
     
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -37,26 +79,41 @@ def get_gmail_service():
                 CREDENTIALS_FILE, SCOPES)
             creds = flow.run_console()
         
-        with open(TOKEN_FILE, 'w') as token:
+        with open(token_file, 'w') as token:
             token.write(creds.to_json())
             
     try:
         service = build('gmail', 'v1', credentials=creds)
-        return service
+        return MeteredService(service, gmail_quota, account)
     except HttpError as error:
         print(f'An error occurred: {error}')
         return None
 
-def mark_as_read(service, msg_id):
-    """Marks an email as read by removing the 'UNREAD' label."""
-    try:
-        service.users().messages().modify(
-            userId='me', 
-            id=msg_id, 
-            body={'removeLabelIds': ['UNREAD']}
-        ).execute()
-    except HttpError as error:
-        print(f'An error occurred while marking as read: {error}')
+_thread_state = threading.local()
+
+def get_thread_gmail_service(token_file=TOKEN_FILE, account='me'):
+    """Returns a Gmail service object owned by the calling thread (googleapiclient is not thread-safe)."""
+    services = getattr(_thread_state, 'services', None)
+    if services is None:
+        services = _thread_state.services = {}
+    if services.get(token_file) is None:
+        services[token_file] = get_gmail_service(token_file, account)
+    return services[token_file]
+
+# The account's address never changes while the service runs, so it is fetched once per service object
+_sender_addresses = weakref.WeakKeyDictionary()
+_sender_lock = threading.Lock()
+
+def get_sender_address(service):
+    """Returns the authenticated account's email address (one getProfile call per service object)."""
+    with _sender_lock:
+        address = _sender_addresses.get(service)
+    if address is None:
+        with metrics.timer("gmail_request_seconds", call="get_profile"):
+            address = service.users().getProfile(userId='me').execute()['emailAddress']
+        with _sender_lock:
+            _sender_addresses[service] = address
+    return address
 
 def create_message(sender, to, subject, message_text):
     message = MIMEText(message_text)
@@ -69,91 +126,332 @@ def create_message(sender, to, subject, message_text):
 def send_email(service, to, subject, body):
     """Sends an email."""
     try:
-        user_profile = service.users().getProfile(userId='me').execute()
-        sender_email = user_profile['emailAddress']
+        sender_email = get_sender_address(service)
         
         message_body = create_message(sender_email, to, subject, body)
         
-        message = service.users().messages().send(
-            userId='me',
-            body=message_body
-        ).execute()
+        with metrics.timer("gmail_request_seconds", call="send"):
+            message = service.users().messages().send(
+                userId='me',
+                body=message_body
+            ).execute()
         
         print(f"Reply sent successfully. Message Id: {message['id']}")
         return message
 
     except HttpError as error:
+        metrics.inc("gmail_errors_total", call="send")
         print(f'An error occurred while sending: {error}')
         return None
 
-def get_unread_emails(service, start_timestamp):
-    """Lists unread emails received AFTER the start_timestamp."""
+def send_emails(service, replies, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Sends several emails through batch requests of `chunk_size` sends each.
+    `replies` is a list of (to, subject, body). Returns the sent message resources in
+    the same order (None where a send failed). Failed sends are not retried here, even
+    for errors polling.is_retryable() considers temporary, since a failed batch item
+    may still have been delivered.
+    """
+    if not replies:
+        return []
     try:
-        result = service.users().messages().list(
-            userId='me', 
-            q=f"is:unread in:inbox after:{start_timestamp}"
-        ).execute()
-        
-        messages = result.get('messages', [])
-        
-        if not messages:
-            return []
-
-        email_list = []
-        for msg in messages:
-            msg_data = service.users().messages().get(
-                userId='me', 
-                id=msg['id'],
-                format='full'
-            ).execute()
-            
-            payload = msg_data['payload']
-            headers = payload['headers']
-            
-            email_info = {
-                'id': msg['id'],
-                'threadId': msg_data['threadId'],
-                'snippet': msg_data['snippet'],
-                'subject': 'No Subject',
-                'sender_full': 'Unknown Sender',
-                'sender_email': 'unknown@example.com',
-                'content': ''
-            }
-
-            for header in headers:
-                name = header['name'].lower()
-                if name == 'subject':
-                    email_info['subject'] = header['value']
-                if name == 'from':
-                    email_info['sender_full'] = header['value']
-                    match = re.search(r'<(.*?)>', header.get('value', ''))
-                    if match:
-                        email_info['sender_email'] = match.group(1)
-                    else:
-                        email_info['sender_email'] = header.get('value', 'unknown@example.com')
-            
-            body_data = ""
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        body_data = part['body']['data']
-                        break
-            elif 'body' in payload:
-                body_data = payload['body']['data']
-            
-            if body_data:
-                email_info['content'] = base64.urlsafe_b64decode(
-                    body_data.encode('ASCII')
-                ).decode('utf-8')
-            
-            email_list.append(email_info)
-            
-        return email_list
+        sender_email = get_sender_address(service)
+    except HttpError as error:
+        metrics.inc("gmail_errors_total", len(replies), call="send")
+        print(f'An error occurred while sending: {error}')
+        return [None] * len(replies)
+
+    results = [None] * len(replies)
+
+    def _callback(request_id, response, exception):
+        if exception is None:
+            results[int(request_id)] = response
+            print(f"Reply sent successfully. Message Id: {response['id']}")
+        else:
+            metrics.inc("gmail_errors_total", call="send")
+            # Rate limits and server errors are worth sending again later; the rest will fail again
+            kind = "temporary error" if is_retryable(exception) else "error"
+            print(f'A {kind} occurred while sending: {exception}')
+
+    for start in range(0, len(replies), chunk_size):
+        batch = service.new_batch_http_request(callback=_callback)
+        for index in range(start, min(start + chunk_size, len(replies))):
+            to, subject, body = replies[index]
+            batch.add(
+                service.users().messages().send(userId='me', body=create_message(sender_email, to, subject, body)),
+                request_id=str(index)
+            )
+        with metrics.timer("gmail_request_seconds", call="batch_send"):
+            batch.execute()
+    return results
+
+def batch_get_messages(service, msg_ids, msg_format='full', metadata_headers=None,
+                       chunk_size=BATCH_CHUNK_SIZE, max_retries=BATCH_MAX_RETRIES):
+    """
+    Fetches many messages through Gmail batch HTTP requests instead of one
+    round trip per message. Items that fail with a retryable error are
+    re-sent in a later batch. Returns a dict of message id -> message resource.
+    """
+    extra = {'metadataHeaders': metadata_headers} if metadata_headers else {}
+    results = {}
+    pending = list(msg_ids)
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(BATCH_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+        retry = []
+
+        def _callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif is_retryable(exception):
+                retry.append(request_id)
+            else:
+                metrics.inc("gmail_errors_total", call="batch_get")
+                print(f'An error occurred while fetching message {request_id}: {exception}')
+
+        for start in range(0, len(pending), chunk_size):
+            batch = service.new_batch_http_request(callback=_callback)
+            for msg_id in pending[start:start + chunk_size]:
+                batch.add(
+                    service.users().messages().get(userId='me', id=msg_id, format=msg_format, **extra),
+                    request_id=msg_id
+                )
+            with metrics.timer("gmail_request_seconds", call="batch_get"):
+                batch.execute()
+
+        metrics.inc("gmail_batch_retries_total", len(retry))
+        pending = retry
+
+    if pending:
+        print(f'Giving up on {len(pending)} message(s) after {max_retries} retries.')
+    return results
+
+def parse_message(msg_data, max_chars=BODY_MAX_CHARS):
+    """Turns a Gmail message resource into the email_info dict used by the main loop."""
+    payload = msg_data['payload']
+    headers = payload.get('headers', [])
+    
+    email_info = {
+        'id': msg_data['id'],
+        'threadId': msg_data['threadId'],
+        'snippet': msg_data.get('snippet', ''),
+        'subject': 'No Subject',
+        'sender_full': 'Unknown Sender',
+        'sender_email': 'unknown@example.com',
+        'content': ''
+    }
+
+    for header in headers:
+        name = header['name'].lower()
+        if name == 'subject':
+            email_info['subject'] = header['value']
+        if name == 'from':
+            email_info['sender_full'] = header['value']
+            match = re.search(r'<(.*?)>', header.get('value', ''))
+            if match:
+                email_info['sender_email'] = match.group(1)
+            else:
+                email_info['sender_email'] = header.get('value', 'unknown@example.com')
+    
+    # Nested multipart, HTML-only and attachment-heavy mail; decoding is bounded by max_chars
+    email_info['content'] = extract_body(payload, max_chars=max_chars)
+
+    return email_info
+
+def fetch_emails(service, msg_ids, headers_only=False, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Fetches and parses the given messages with batch requests of `chunk_size` messages.
+    With headers_only=True only Subject/From are fetched (format='metadata'),
+    which is much cheaper when the body is not needed yet.
+    """
+    if not msg_ids:
+        return []
+
+    if headers_only:
+        fetched = batch_get_messages(
+            service, msg_ids, msg_format='metadata',
+            metadata_headers=['Subject', 'From'], chunk_size=chunk_size
+        )
+    else:
+        fetched = batch_get_messages(service, msg_ids, msg_format='full', chunk_size=chunk_size)
+
+    # Keep the order the IDs were listed in
+    return [parse_message(fetched[msg_id]) for msg_id in msg_ids if msg_id in fetched]
+
+def get_unread_emails(service, start_timestamp, headers_only=False, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Lists unread emails received AFTER the start_timestamp, across all result pages.
+    Message bodies are fetched with batch requests (see fetch_emails).
+    """
+    try:
+        msg_ids = list_all_message_ids(service, f"is:unread in:inbox after:{start_timestamp}")
+        return fetch_emails(service, msg_ids, headers_only=headers_only, chunk_size=chunk_size)
 
     except HttpError as error:
         print(f'An error occurred: {error}')
         return []
 
+def get_new_emails(service, sync, headers_only=False, chunk_size=BATCH_CHUNK_SIZE, raise_errors=False):
+    """
+    Returns only the emails added since the previous call, using the
+    historyId cursor kept by a MailboxSync instead of re-running the full query.
+    The cursor only advances once the messages are fetched, so a failed fetch is
+    retried by the next call. With raise_errors=True a failed poll raises its HttpError (e.g. for a PollScheduler)
+    instead of returning [].
+    """
+    try:
+        msg_ids = sync.poll()
+        emails = fetch_emails(service, msg_ids, headers_only=headers_only, chunk_size=chunk_size)
+        sync.commit(msg_ids, [email['id'] for email in emails])
+        return emails
+
+    except HttpError as error:
+        if raise_errors:
+            raise
+        print(f'An error occurred: {error}')
+        return []
+
+class Mailbox:
+    """
+    One Gmail account served by this process.
+
+    Each mailbox has its own credentials, sync cursor, work journal, read-marking
+    and send path, but its classification and generation run on a FairExecutor
+    shared by all mailboxes, so one set of loaded models serves every account.
+    A mailbox has at most `max_in_flight` emails in the models at once, and the
+    executor serves mailboxes round-robin, so a busy inbox cannot starve the others.
+    """
+    def __init__(self, name, inference, classify_emails, run_workflow,
+                 token_file=TOKEN_FILE, journal_path=WORK_JOURNAL_PATH,
+                 max_in_flight=PIPELINE_GENERATE_WORKERS):
+        """
+        Args:
+            name (str): Account name used in logs, quota accounting and metrics.
+            inference (FairExecutor): Shared executor that runs the model calls.
+            classify_emails / run_workflow: The model entry points from main_graph.
+            token_file (str): OAuth token of this account.
+            journal_path (str): This account's WorkJournal file.
+            max_in_flight (int): Emails of this account being generated at once.
+        """
+        self.name = name
+        self.token_file = token_file
+        self.max_in_flight = max_in_flight
+        self._inference = inference
+        self._classify_emails = classify_emails
+        self._run_workflow = run_workflow
+        self.journal = WorkJournal(journal_path)
+        self.pipeline = None
+        self.read_marker = None
+
+    def start(self):
+        """Authenticates, resumes unfinished work and starts polling. Returns False if authentication failed."""
+        service = get_gmail_service(self.token_file, self.name)
+        if not service:
+            print(f"[{self.name}] Failed to authenticate with Gmail.")
+            return False
+
+        sync = MailboxSync(service, int(time.time()))
+        self.read_marker = ReadMarker(
+            self._thread_service,
+            flush_size=READ_MARK_FLUSH_SIZE,
+            flush_interval=READ_MARK_FLUSH_INTERVAL_SECONDS,
+            on_marked=self.journal.record_acknowledged
+        )
+        self.journal.prune(WORK_JOURNAL_RETENTION_SECONDS)
+        resume = self.journal.unfinished()
+        scheduler = PollScheduler(
+            min_interval=POLL_MIN_INTERVAL_SECONDS,
+            max_interval=POLL_MAX_INTERVAL_SECONDS,
+            backoff=POLL_BACKOFF_FACTOR,
+            error_interval=POLL_ERROR_BACKOFF_SECONDS,
+            max_error_interval=POLL_MAX_ERROR_BACKOFF_SECONDS,
+            quota=gmail_quota,
+            account=self.name
+        )
+        self.pipeline = MailPipeline(
+            # Messages already in the journal (e.g. re-listed after a full resync) are skipped
+            fetch_fn=lambda: self.journal.record_fetched(get_new_emails(service, sync, raise_errors=True)),
+            classify_fn=self._classify_batch,
+            generate_fn=self._generate_reply,
+            send_fn=self._send_replies,
+            scheduler=scheduler,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            classify_workers=PIPELINE_CLASSIFY_WORKERS,
+            # Each pipeline thread waits on one model call, so this caps the mailbox's share
+            generate_workers=self.max_in_flight,
+            send_workers=PIPELINE_SEND_WORKERS,
+            send_batch_size=PIPELINE_SEND_BATCH_SIZE,
+        )
+        self.pipeline.start()
+
+        # Pick up whatever the previous run left unfinished, each from its last completed step
+        if any(resume.values()):
+            print(f"[{self.name}] Resuming unfinished work: { {step: len(items) for step, items in resume.items()} }")
+        for msg_id in resume['acknowledge']:
+            self.read_marker.add(msg_id)
+        self.pipeline.enqueue(classify=resume['classify'], generate=resume['generate'], send=resume['send'])
+        return True
+
+    def stop(self):
+        """Stops polling, finishes every fetched email and closes the journal."""
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.read_marker.close()
+            print(f"[{self.name}] Stopped after processing {self.pipeline.processed} email(s).")
+        self.journal.close()
+
+    def _thread_service(self):
+        return get_thread_gmail_service(self.token_file, self.name)
+
+    def _classify_batch(self, emails):
+        # Classify all waiting emails together when there is a backlog
+        if len(emails) > 1:
+            texts = [email['content'].strip() for email in emails]
+            predictions = self._inference.submit(
+                self.name, self._classify_emails, texts, with_confidence=True
+            ).result()
+        else:
+            predictions = [(None, None)] * len(emails)  # The workflow classifies single emails itself
+        for email, (intent, confidence) in zip(emails, predictions):
+            self.journal.record_classified(email['id'], intent, confidence)
+        return predictions
+
+    def _generate_reply(self, email, prediction):
+        # (intent, confidence) from _classify_batch or the journal; (None, None) lets the workflow classify
+        intent, confidence = prediction
+        print(f"[{self.name}] Processing email from: {email['sender_email']}")
+        reply = self._inference.submit(
+            self.name, self._run_workflow,
+            email_content=email['content'].strip(),
+            sender_email=email['sender_email'],
+            subject=email['subject'],
+            intent=intent,
+            confidence=confidence
+        ).result()
+        self.journal.record_generated(email['id'], reply)
+        return reply
+
+    def _send_replies(self, items):
+        # Each send worker uses its own service object (they are not thread-safe)
+        thread_service = self._thread_service()
+        replies = [(email['sender_email'], reply['reply_subject'], reply['reply_body']) for email, reply in items]
+        if len(replies) == 1:
+            sent = [send_email(thread_service, *replies[0])]
+        else:
+            sent = send_emails(thread_service, replies)
+        for (email, _), message in zip(items, sent):
+            if message is None:
+                # Stays unread and 'generated' in the journal, so it is sent again on restart
+                print(f"[{self.name}] Email {email['id']} was not answered; it will be retried on restart.")
+                continue
+            self.journal.record_sent(email['id'], message['id'])
+            self.read_marker.add(email['id'])
+            print(f"[{self.name}] Processed email {email['id']}; it will be marked as read.")
+
 if __name__ == "__main__":
 
     # configg()
@@ -191,66 +489,63 @@ if __name__ == "__main__":
     print(generated_email_2)
     '''
 
+    # --- IMPORT THE LANGGRAPH WORKFLOW ---
+    # Models load lazily; preloading overlaps the load with Gmail authentication
+    from main_graph import run_workflow, classify_emails, preload_in_background, shutdown  # Import the helper functions
+    from config import PRELOAD_MODELS, print_config
+    from config import METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL_SECONDS
+    from config import GENERATION_WORKERS
+
+    print_config()
+    if PRELOAD_MODELS:
+        preload_in_background()
+
+    # One set of models serves every mailbox; the executor shares it fairly between them
+    # (one worker per generator process keeps every process busy)
+    inference_workers = max(PIPELINE_GENERATE_WORKERS, GENERATION_WORKERS)
+    max_in_flight = MAILBOX_MAX_IN_FLIGHT or inference_workers
+    inference = FairExecutor(workers=inference_workers, max_in_flight_per_key=max_in_flight, name="inference")
+    accounts = MAILBOX_ACCOUNTS or [{'name': 'me', 'token_file': TOKEN_FILE, 'journal_path': WORK_JOURNAL_PATH}]
+    mailboxes = [
+        Mailbox(
+            account['name'], inference, classify_emails, run_workflow,
+            token_file=account.get('token_file', f"token.{account['name']}.json"),
+            journal_path=account.get('journal_path', f"work_journal.{account['name']}.sqlite"),
+            max_in_flight=max_in_flight
+        )
+        for account in accounts
+    ]
+
     print("Starting mail attender service...")
-    service = get_gmail_service()
-    
-    if not service:
+    running = [mailbox for mailbox in mailboxes if mailbox.start()]
+
+    if not running:
         print("Failed to authenticate with Gmail. Exiting.")
     else:
-        start_time_unix = int(time.time()) 
-        print(f"Service running. Ignoring emails received before startup.")
-        print(f"Checking for new mail every {POLLING_INTERVAL_SECONDS} seconds...")
-        
-        while True:
-            try:
-                emails = get_unread_emails(service, start_time_unix)
-                
-                if emails:
-                    print(f"\n--- Found {len(emails)} new email(s)! ---")
-                    
-                    for email in emails:
-                        # 1. Prepare data
-                        email_data = {
-                            "sender": email['sender_email'],
-                            "subject": email['subject'],
-                            "content": email['content'].strip()
-                        }
-                        
-                        print("--- Calling LangGraph Workflow ---")
-                        print(f"Processing email from: {email_data['sender']}")
-                        
-                        # 2. Run the LangGraph workflow
-                        reply = run_workflow(
-                            email_content=email_data['content'],
-                            sender_email=email_data['sender'],
-                            subject=email_data['subject']
-                        )
-                        
-                        print("--- Workflow Generated Reply ---")
-                        
-                        # 3. Send the AI-generated reply
-                        send_email(
-                            service, 
-                            email_data['sender'],
-                            reply['reply_subject'], 
-                            reply['reply_body']
-                        )
-                        
-                        # 4. Mark original email as read
-                        mark_as_read(service, email['id'])
-                        print(f"Processed and marked email {email['id']} as read.")
-                    
-                    print(f"\nWaiting for {POLLING_INTERVAL_SECONDS} seconds...")
-
-                else:
-                    print(f". (No new mail. Waiting {POLLING_INTERVAL_SECONDS}s)", end="", flush=True)
-
-                time.sleep(POLLING_INTERVAL_SECONDS)
-            
-            except KeyboardInterrupt:
-                print("\nStopping service.")
-                break
-            except Exception as e:
-                print(f"\nAn error occurred in the main loop: {e}")
-                print(f"Restarting loop in {POLLING_INTERVAL_SECONDS} seconds...")
-                time.sleep(POLLING_INTERVAL_SECONDS)
\ No newline at end of file
+        print(f"Service running for {len(running)} mailbox(es). Ignoring emails received before startup.")
+        print(f"Checking for new mail every {POLL_MIN_INTERVAL_SECONDS}-{POLL_MAX_INTERVAL_SECONDS} seconds...")
+
+        def sum_by_key(callbacks):
+            totals = {}
+            for callback in callbacks:
+                for key, value in callback().items():
+                    totals[key] = totals.get(key, 0) + value
+            return totals
+
+        metrics.gauge_callback("pipeline_queue_depth",
+                               lambda: sum_by_key(m.pipeline.queue_depths for m in running), label="stage")
+        metrics.gauge_callback("journal_messages",
+                               lambda: sum_by_key(m.journal.backlog for m in running), label="state")
+        metrics.gauge_callback("inference_queue_depth", inference.pending, label="account")
+        metrics.gauge_callback("gmail_quota_units_spent", gmail_quota.totals, label="account")
+        start_exporter(port=METRICS_PORT, file_path=METRICS_FILE, interval=METRICS_FILE_INTERVAL_SECONDS)
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nStopping service. Finishing in-flight emails...")
+    for mailbox in mailboxes:
+        mailbox.stop()
+    inference.close()
+    shutdown()
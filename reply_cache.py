@@ -0,0 +1,122 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+SIMHASH_BITS = 64
+
+
+def normalize_body(text: str) -> str:
+    """Lower-cases and collapses whitespace so trivially different copies compare equal."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in only a few bits."""
+    words = text.split()
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+class ReplyCache:
+    """
+    Reuses generated drafts for mass emails that reach many recipients.
+
+    A draft is reused only when the intent and task details match exactly and the
+    email body is either identical after normalization (exact fast path) or its
+    SimHash similarity is at least `threshold`. Entries are evicted least recently
+    used once `max_entries` is reached.
+    """
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.9):
+        """
+        Args:
+            max_entries (int): Maximum number of stored drafts.
+            threshold (float): Minimum SimHash similarity (1 - hamming / 64) for a near-duplicate hit.
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._exact = OrderedDict()   # exact key -> (group key, fingerprint, draft)
+        self._groups = {}             # (intent, details) -> {exact key: fingerprint}
+        self._lock = threading.Lock()
+
+    def lookup(self, intent: str, details: str, body: str) -> Optional[str]:
+        """Returns a stored draft for this (intent, details, body), or None."""
+        normalized = normalize_body(body)
+        group = (intent, details)
+        key = self._exact_key(group, normalized)
+
+        with self._lock:
+            # 1. Exact-match fast path
+            entry = self._exact.get(key)
+            if entry is not None:
+                self._exact.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2]
+            has_candidates = bool(self._groups.get(group))
+
+        # Fingerprinting a long body is slow, so it runs without holding the lock
+        fingerprint = simhash(normalized) if has_candidates else None
+
+        with self._lock:
+            # 2. Near-duplicate search among drafts for the same intent and details
+            candidates = self._groups.get(group)
+            if candidates and fingerprint is not None:
+                best_key, best_similarity = None, self.threshold
+                for candidate_key, candidate_fingerprint in candidates.items():
+                    similarity = 1 - bin(fingerprint ^ candidate_fingerprint).count("1") / SIMHASH_BITS
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = candidate_key, similarity
+                if best_key is not None:
+                    self._exact.move_to_end(best_key)
+                    self.near_hits += 1
+                    return self._exact[best_key][2]
+
+            self.misses += 1
+            return None
+
+    def store(self, intent: str, details: str, body: str, draft: str) -> None:
+        """Remembers the draft generated for this (intent, details, body)."""
+        normalized = normalize_body(body)
+        group = (intent, details)
+        key = self._exact_key(group, normalized)
+        fingerprint = simhash(normalized)
+
+        with self._lock:
+            self._exact[key] = (group, fingerprint, draft)
+            self._exact.move_to_end(key)
+            self._groups.setdefault(group, {})[key] = fingerprint
+
+            while len(self._exact) > self.max_entries:
+                old_key, (old_group, _, _) = self._exact.popitem(last=False)
+                members = self._groups[old_group]
+                del members[old_key]
+                if not members:
+                    del self._groups[old_group]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "entries": len(self._exact),
+            }
+
+    @staticmethod
+    def _exact_key(group, normalized: str) -> str:
+        intent, details = group
+        return hashlib.sha256(f"{intent}\0{details}\0{normalized}".encode("utf-8")).hexdigest()
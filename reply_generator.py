@@ -1,42 +1,174 @@
+import copy
+import os
+import threading
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, GPTQConfig
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    BitsAndBytesConfig,
+    GPTQConfig,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
 from peft import PeftModel
 
+from metrics import TOKENS_PER_SECOND_BUCKETS, metrics
+
+# Precisions supported by EmailGenerator on CPU-only hosts
+CPU_MODES = ("fp32", "bf16", "int8")
+
+# The prompt is a fixed instruction prefix plus a per-email part. The prefix ends on a
+# "\n\n" token boundary so it can be tokenized (and its KV cache computed) on its own.
+PROMPT_PREFIX = (
+    "<start_of_turn>user\n"
+    "As a corporate assistant, write a formal email based on the following intent and details.\n\n"
+)
+PROMPT_BODY = "Intent: {intent}\n\nDetails: {details}<end_of_turn>\n<start_of_turn>model\n"
+
+# Markers that end a streamed reply early (Gemma's end-of-turn marker by default)
+DEFAULT_STOP_SEQUENCES = ("<end_of_turn>",)
+
+
+def merge_adapters(base_model_id: str, adapter_path: str, output_dir: str) -> str:
+    """
+    Merges the LoRA adapters into the Gemma base weights and saves the result,
+    so EmailGenerator can later load one plain checkpoint via `merged_model_path`.
+
+    Returns:
+        str: The directory the merged model and tokenizer were saved to.
+    """
+    print(f"Loading base model: {base_model_id}...")
+    base_model = AutoModelForCausalLM.from_pretrained(base_model_id, trust_remote_code=True)
+    print(f"Merging adapters from: {adapter_path}...")
+    merged = PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+    merged.save_pretrained(output_dir, safe_serialization=True)
+    AutoTokenizer.from_pretrained(base_model_id).save_pretrained(output_dir)
+    print(f"Merged model saved to: {output_dir}")
+    return output_dir
+
+
+class _StopOnSequences(StoppingCriteria):
+    """Stops generation once a stop sequence appears in the new tokens or on cancel."""
+
+    def __init__(self, tokenizer, stop_sequences: Sequence[str], prompt_length: int, cancel: threading.Event):
+        self.tokenizer = tokenizer
+        self.stop_sequences = list(stop_sequences)
+        self.prompt_length = prompt_length
+        self.cancel = cancel
+        # Only the last few tokens need decoding to spot a stop sequence
+        self.window = max((len(stop) for stop in self.stop_sequences), default=0) + 8
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        if self.cancel.is_set():
+            return True
+        if not self.stop_sequences:
+            return False
+        tail = input_ids[0, self.prompt_length:][-self.window:]
+        text = self.tokenizer.decode(tail, skip_special_tokens=False)
+        return any(stop in text for stop in self.stop_sequences)
+
+
 class EmailGenerator:
 
-    def __init__(self, base_model_id: str, adapter_path: str):
+    def __init__(self, base_model_id: str, adapter_path: str,
+                 merged_model_path: Optional[str] = None, cpu_mode: str = "fp32",
+                 use_prefix_cache: bool = True, assistant_model_id: Optional[str] = None,
+                 num_assistant_tokens: int = 5):
         """
         Initializes the generator by loading the base model and merging LoRA adapters.
 
         Args:
             base_model_id (str): The identifier of the base model (e.g., 'google/gemma-2b-it').
             adapter_path (str): The local path to the fine-tuned LoRA adapters.
+            merged_model_path (str, optional): A checkpoint saved by merge_adapters(). When it
+                exists it is loaded directly and the adapters are not applied again.
+            cpu_mode (str): Precision used on CPU-only hosts: 'fp32', 'bf16' or 'int8'
+                (int8 = dynamic quantization of the Linear layers).
+            use_prefix_cache (bool): Compute the KV cache of the fixed instruction prefix once
+                and reuse it for every single-prompt generate()/generate_stream() call.
+            assistant_model_id (str, optional): A small draft model sharing Gemma's tokenizer.
+                When set, generate() uses assisted (speculative) decoding: the draft proposes
+                tokens and Gemma verifies them in one forward pass. Greedy output is unchanged.
+            num_assistant_tokens (int): Tokens the draft model proposes per verification step.
         """
+        if cpu_mode not in CPU_MODES:
+            raise ValueError(f"cpu_mode must be one of {CPU_MODES}, got {cpu_mode!r}")
+
         print("--- Initializing Email Generator ---")
+        load_start = time.perf_counter()
         
         # 1. Set device
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using device: {self.device}")
+        self.cpu_mode = cpu_mode if self.device == "cpu" else None
+        print(f"Using device: {self.device}" + (f" ({cpu_mode})" if self.cpu_mode else ""))
 
+        use_merged = bool(merged_model_path) and os.path.isdir(merged_model_path)
+        model_source = merged_model_path if use_merged else base_model_id
 
-        # 4. Load the tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(base_model_id)
+        # 2. Load the tokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_source)
+        # Decoder-only models must be left-padded for batched generation
+        self.tokenizer.padding_side = "left"
 
-        # 3. Load the base model
-        print(f"Loading base model: {base_model_id}...")
-        base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_id,
-            device_map="auto", # for GPU only
-            trust_remote_code=True,
-        )
+        # device_map="auto" only helps on GPU; on CPU we pick the precision ourselves
+        load_kwargs = {"trust_remote_code": True}
+        if self.device == "cuda":
+            load_kwargs["device_map"] = "auto"
+        elif cpu_mode == "bf16":
+            load_kwargs["dtype"] = torch.bfloat16
+
+        if use_merged:
+            # 3. Load the pre-merged checkpoint (no PEFT wrapping at startup)
+            print(f"Loading merged model: {merged_model_path}...")
+            self.model = AutoModelForCausalLM.from_pretrained(merged_model_path, **load_kwargs)
+        else:
+            # 3. Load the base model
+            print(f"Loading base model: {base_model_id}...")
+            base_model = AutoModelForCausalLM.from_pretrained(base_model_id, **load_kwargs)
+
+            # 4. Apply the LoRA adapters
+            print(f"Loading and merging adapters from: {adapter_path}...")
+            self.model = PeftModel.from_pretrained(base_model, adapter_path)
+            if self.device == "cpu":
+                # Fold the adapters into the base weights so CPU decoding skips the LoRA layers
+                self.model = self.model.merge_and_unload()
 
-        # 5. Merge the LoRA adapters into the base model
-        print(f"Loading and merging adapters from: {adapter_path}...")
-        self.model = PeftModel.from_pretrained(base_model, adapter_path)
+        # 5. Optionally quantize the Linear layers to int8 for CPU inference
+        if self.cpu_mode == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
         
         # 6. Set model to evaluation mode for faster inference
         self.model.eval()
-        print("--- Initialization complete. Ready to generate. ---\n")
+
+        # The prefix KV cache is built lazily on the first generate() call
+        self.use_prefix_cache = use_prefix_cache
+        self._prefix_state = None
+        self._prefix_lock = threading.Lock()
+
+        # 7. Optionally load the draft model for assisted generation
+        self.assistant_model = None
+        self._assisted_totals = {"calls": 0, "new_tokens": 0, "target_passes": 0, "draft_tokens": 0}
+        self._assisted_lock = threading.Lock()
+        self._pass_counts = threading.local()
+        if assistant_model_id:
+            print(f"Loading assistant (draft) model: {assistant_model_id}...")
+            self.assistant_model = AutoModelForCausalLM.from_pretrained(
+                assistant_model_id, **load_kwargs
+            ).eval()
+            self.assistant_model.generation_config.num_assistant_tokens = num_assistant_tokens
+            # Count forward passes per thread: every draft pass proposes one token and every
+            # target pass verifies a run of them, which gives the acceptance rate
+            target = self.model.get_base_model() if isinstance(self.model, PeftModel) else self.model
+            target.register_forward_hook(lambda *_: self._count_pass("target"))
+            self.assistant_model.register_forward_hook(lambda *_: self._count_pass("draft"))
+        self.load_seconds = time.perf_counter() - load_start
+        print(f"--- Initialization complete in {self.load_seconds:.1f}s. Ready to generate. ---\n")
 
     def generate(self, intent: str, details: str) -> str:
         """
@@ -49,34 +181,245 @@ class EmailGenerator:
         Returns:
             str: The generated email content.
         """
-        # 1. Create a structured prompt for the model
-        prompt = (
-            "As a corporate assistant, write a formal email based on the following "
-            f"intent and details.\n\nIntent: {intent}\n\nDetails: {details}"
-        )
-        
-        # 2. Format the prompt according to Gemma's chat template
-        formatted_prompt = f"<start_of_turn>user\n{prompt}<end_of_turn>\n<start_of_turn>model\n"
+        # 1-2. Tokenize the prompt and generate the response
+        new_tokens = self._generate_tokens(intent, details)
+
+        # 3. Decode only the newly generated tokens, skipping special tokens
+        response_text = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+        # 4. Clean the output to return only the model's generated text
+        return self._clean(response_text)
+
+    def _generate_tokens(self, intent: str, details: str, do_sample: bool = True, assisted: bool = True):
+        """Runs model.generate for one prompt and returns only the new token IDs."""
+        use_assistant = assisted and self.assistant_model is not None
+
+        # 1. Build and tokenize the Gemma-formatted prompt (reusing the cached prefix).
+        #    The draft model keeps its own cache, so assisted runs start from the full prompt.
+        inputs, past_key_values = self._prepare_inputs(intent, details, use_prefix_cache=not use_assistant)
 
-        # 3. Tokenize the input and move it to the configured device
-        inputs = self.tokenizer(formatted_prompt, return_tensors="pt").to(self.device)
+        sampling = {"temperature": 0.2} if do_sample else {}  # Low temperature for professional, predictable output
+        if use_assistant:
+            sampling["assistant_model"] = self.assistant_model
+            self._pass_counts.target = self._pass_counts.draft = 0
 
-        # 4. Generate the response
+        # 2. Generate the response
+        start = time.perf_counter()
         with torch.no_grad():  # Disable gradient calculation for inference
             outputs = self.model.generate(
                 **inputs,
+                past_key_values=past_key_values,
                 max_new_tokens=256,
-                temperature=0.2,    # Low temperature for professional, predictable output
-                do_sample=True      # Enable sampling for more natural text
+                do_sample=do_sample,     # Enable sampling for more natural text
+                **sampling
             )
 
-        # 5. Decode the output, skipping special tokens
-        response_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        prompt_length = inputs["input_ids"].shape[1]
+        new_tokens = outputs[0][prompt_length:]
+        self._record_generation(prompt_length, len(new_tokens), time.perf_counter() - start)
+        if use_assistant:
+            self._record_assisted_call(len(new_tokens))
+        return new_tokens
 
-        # 6. Clean the output to return only the model's generated text
-        completion = response_text.split("<start_of_turn>model\n")[-1].strip()
+    def assisted_stats(self) -> dict:
+        """
+        Acceptance statistics for assisted generation. Each target pass accepts some
+        drafted tokens and adds one of its own, so accepted = new tokens - target passes.
+        """
+        with self._assisted_lock:
+            totals = dict(self._assisted_totals)
+        accepted = max(totals["new_tokens"] - totals["target_passes"], 0)
+        totals["accepted_tokens"] = accepted
+        totals["acceptance_rate"] = accepted / totals["draft_tokens"] if totals["draft_tokens"] else 0.0
+        totals["tokens_per_target_pass"] = (
+            totals["new_tokens"] / totals["target_passes"] if totals["target_passes"] else 0.0
+        )
+        return totals
+
+    def _count_pass(self, model_name: str):
+        if hasattr(self._pass_counts, model_name):
+            setattr(self._pass_counts, model_name, getattr(self._pass_counts, model_name) + 1)
 
-        return completion
+    def _record_assisted_call(self, new_token_count: int):
+        with self._assisted_lock:
+            self._assisted_totals["calls"] += 1
+            self._assisted_totals["new_tokens"] += new_token_count
+            self._assisted_totals["target_passes"] += self._pass_counts.target
+            self._assisted_totals["draft_tokens"] += self._pass_counts.draft
+
+    @staticmethod
+    def _record_generation(prompt_tokens: int, new_token_count: int, seconds: float):
+        if not metrics.enabled:
+            return
+        metrics.observe("gemma_generate_seconds", seconds)
+        metrics.inc("gemma_prompt_tokens_total", prompt_tokens)
+        metrics.inc("gemma_generated_tokens_total", new_token_count)
+        if seconds > 0:
+            metrics.observe("gemma_tokens_per_second", new_token_count / seconds, buckets=TOKENS_PER_SECOND_BUCKETS)
+
+    def generate_batch(self, requests: List[Tuple[str, str]], batch_size: int = 8) -> List[str]:
+        """
+        Generates several formal emails together in left-padded batches.
+
+        Args:
+            requests (List[Tuple[str, str]]): (intent, details) pairs, one per email.
+            batch_size (int): Maximum number of prompts decoded together.
+
+        Returns:
+            List[str]: The generated email contents, in the same order as `requests`.
+        """
+        completions = []
+        for start in range(0, len(requests), batch_size):
+            chunk = requests[start:start + batch_size]
+            prompts = [self._build_prompt(intent, details) for intent, details in chunk]
+
+            # 1. Left-pad so every prompt ends right where generation starts
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+
+            # 2. Generate all responses in one call
+            batch_start = time.perf_counter()
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=256,
+                    temperature=0.2,
+                    do_sample=True,
+                    pad_token_id=self.tokenizer.pad_token_id
+                )
+
+            # 3. Drop padding + prompt tokens, then decode only the new tokens
+            prompt_length = inputs["input_ids"].shape[1]
+            new_tokens = outputs[:, prompt_length:]
+            self._record_generation(
+                int(inputs["attention_mask"].sum()),
+                int((new_tokens != self.tokenizer.pad_token_id).sum()),
+                time.perf_counter() - batch_start
+            )
+            for response_text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True):
+                completions.append(self._clean(response_text))
+
+        return completions
+
+    def generate_stream(
+        self,
+        intent: str,
+        details: str,
+        stop_sequences: Sequence[str] = DEFAULT_STOP_SEQUENCES,
+    ) -> Iterator[str]:
+        """
+        Generates a formal email and yields text chunks as tokens are produced.
+
+        Generation runs in a background thread and ends early as soon as any of
+        `stop_sequences` appears (or the caller stops iterating), so replies that
+        finish early stop using compute. The stop sequence itself is not yielded.
+
+        Args:
+            intent (str): The primary purpose of the email (e.g., 'Financial Report').
+            details (str): Specific details to include in the email content.
+            stop_sequences (Sequence[str]): Text markers that end generation,
+                e.g. '<end_of_turn>' or a signature line.
+
+        Yields:
+            str: Successive pieces of the generated email content.
+        """
+        stop_sequences = [stop for stop in stop_sequences if stop]
+
+        # 1. Build and tokenize the prompt (reusing the cached prefix)
+        inputs, past_key_values = self._prepare_inputs(intent, details)
+        prompt_length = inputs["input_ids"].shape[1]
+
+        # 2. Set up the streamer and the early-stop criterion
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancel = threading.Event()
+        stopper = _StopOnSequences(self.tokenizer, stop_sequences, prompt_length, cancel)
+        errors = []
+
+        def _run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        **inputs,
+                        past_key_values=past_key_values,
+                        max_new_tokens=256,
+                        temperature=0.2,
+                        do_sample=True,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([stopper])
+                    )
+            except Exception as error:  # Surface the failure to the consuming thread
+                errors.append(error)
+                streamer.end()
+
+        # 3. Generate in the background while the caller consumes chunks
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+
+        # Hold back enough text that a stop sequence split across chunks is never emitted
+        holdback = max((len(stop) for stop in stop_sequences), default=1) - 1
+        buffer = ""
+        try:
+            for chunk in streamer:
+                buffer += chunk
+                cut = min((buffer.find(stop) for stop in stop_sequences if stop in buffer), default=-1)
+                if cut >= 0:
+                    if buffer[:cut]:
+                        yield buffer[:cut]
+                    buffer = ""
+                    break
+                safe = len(buffer) - holdback
+                if safe > 0:
+                    yield buffer[:safe]
+                    buffer = buffer[safe:]
+            if buffer:
+                yield buffer
+        finally:
+            # Stop the model if the caller hit a stop sequence or abandoned the stream
+            cancel.set()
+            worker.join()
+
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _build_prompt(intent: str, details: str) -> str:
+        """Creates the structured prompt in Gemma's chat template."""
+        return PROMPT_PREFIX + PROMPT_BODY.format(intent=intent, details=details)
+
+    def _prepare_inputs(self, intent: str, details: str, use_prefix_cache: bool = True):
+        """
+        Tokenizes a single prompt. With the prefix cache enabled, returns the shared
+        prefix's past key values too, so generate() only prefills the per-email tokens.
+        """
+        if not (self.use_prefix_cache and use_prefix_cache):
+            formatted_prompt = self._build_prompt(intent, details)
+            return self.tokenizer(formatted_prompt, return_tensors="pt").to(self.device), None
+
+        prefix_ids, prefix_cache = self._get_prefix_cache()
+        body_ids = self.tokenizer(
+            PROMPT_BODY.format(intent=intent, details=details),
+            add_special_tokens=False,
+            return_tensors="pt"
+        )["input_ids"].to(self.device)
+        input_ids = torch.cat([prefix_ids, body_ids], dim=1)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        # generate() extends the cache in place, so each call gets its own copy
+        return inputs, copy.deepcopy(prefix_cache)
+
+    def _get_prefix_cache(self):
+        """Computes the KV cache for PROMPT_PREFIX once; recomputed if the template changes."""
+        with self._prefix_lock:
+            if self._prefix_state is None or self._prefix_state[0] != PROMPT_PREFIX:
+                prefix_ids = self.tokenizer(PROMPT_PREFIX, return_tensors="pt")["input_ids"].to(self.device)
+                with torch.no_grad():
+                    past_key_values = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+                self._prefix_state = (PROMPT_PREFIX, prefix_ids, past_key_values)
+            _, prefix_ids, past_key_values = self._prefix_state
+            return prefix_ids, past_key_values
+
+    @staticmethod
+    def _clean(response_text: str) -> str:
+        """Returns only the model's turn from a decoded response."""
+        return response_text.split("<start_of_turn>model\n")[-1].strip()
 
 # ==============================================================================
 # 🚀 HOW TO USE THE CLASS
@@ -110,4 +453,20 @@ if __name__ == "__main__":
         details="Announce the successful merger with Innovate Corp. Emphasize the strategic benefits and the expected synergies. A town hall meeting is scheduled for next Friday at 10 AM."
     )
     print("\n--- Generated Email ---\n")
-    print(generated_email_2)
\ No newline at end of file
+    print(generated_email_2)
+
+    # Several replies decoded together in one left-padded batch
+    print("\n\n--- Generating Batch ---")
+    batch_emails = email_bot.generate_batch([
+        (email_intent, email_details),
+        ("Sustainability Initiative", "Share that carbon emissions were reduced by 15% in Q3."),
+    ])
+    for reply in batch_emails:
+        print("\n--- Generated Email ---\n")
+        print(reply)
+
+    # Streamed reply: chunks are printed as soon as they are produced
+    print("\n\n--- Streaming Email ---\n")
+    for chunk in email_bot.generate_stream(intent=email_intent, details=email_details):
+        print(chunk, end="", flush=True)
+    print()
@@ -0,0 +1,52 @@
+import threading
+from typing import Optional
+
+# Template key used for intents that have no template of their own
+DEFAULT_TEMPLATE = "*"
+
+
+class ReplyTemplates:
+    """
+    Answers routine emails from fixed per-intent templates instead of running Gemma.
+
+    A template is used only when the classifier's confidence is at least the
+    template's `min_confidence` and every {placeholder} in it can be filled from the
+    email's task_details (plus sender_email / original_subject). Otherwise the
+    email falls through to normal generation.
+    """
+    def __init__(self, templates: dict):
+        """
+        Args:
+            templates (dict): intent -> {"min_confidence": float, "body": str}. The key "*"
+                applies to every intent without its own entry.
+        """
+        self.templates = templates
+        self.hits = {}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def render(self, intent: str, confidence: Optional[float], fields: dict) -> Optional[str]:
+        """Returns the filled template for this email, or None when it should be generated."""
+        template = self.templates.get(intent, self.templates.get(DEFAULT_TEMPLATE))
+        body = None
+        if template is not None and confidence is not None and confidence >= template["min_confidence"]:
+            try:
+                body = template["body"].format_map(fields)
+            except (KeyError, IndexError, ValueError):
+                body = None  # The details lack a field this template needs
+
+        with self._lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits[intent] = self.hits.get(intent, 0) + 1
+        return body
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.hits.values()) + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": sum(self.hits.values()) / total if total else 0.0,
+            }
@@ -0,0 +1,97 @@
+import base64
+
+import pytest
+
+from mime_extract import MAX_PARTS, decode_prefix, extract_body, iter_parts, strip_quotes_and_signature
+
+
+def b64(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def part(mime_type, text, **extra):
+    return {"mimeType": mime_type, "body": {"data": b64(text)}, **extra}
+
+
+def multipart(*parts, mime_type="multipart/mixed"):
+    return {"mimeType": mime_type, "parts": list(parts)}
+
+
+def test_nested_multipart_prefers_plain_text():
+    payload = multipart(
+        multipart(part("text/html", "<p>HTML version</p>"), part("text/plain", "Plain version"),
+                  mime_type="multipart/alternative"),
+        part("application/pdf", "%PDF", filename="report.pdf"),
+    )
+    assert extract_body(payload) == "Plain version"
+
+
+def test_parts_are_walked_in_document_order():
+    payload = multipart(part("text/plain", "first"), multipart(part("text/plain", "second")))
+    assert [p["body"]["data"] for p in iter_parts(payload)] == [b64("first"), b64("second")]
+
+
+def test_attachments_are_skipped():
+    attached = [
+        part("text/plain", "named file", filename="notes.txt"),
+        {"mimeType": "text/plain", "body": {"attachmentId": "abc", "size": 10}},
+        part("text/plain", "disposition",
+             headers=[{"name": "Content-Disposition", "value": "attachment; filename=x.txt"}]),
+    ]
+    assert extract_body(multipart(*attached, part("text/plain", "The message"))) == "The message"
+    assert extract_body(multipart(*attached)) == ""
+
+
+def test_html_only_body_is_converted_to_text():
+    markup = ("<html><head><style>p {color: red}</style></head><body>"
+              "<p>Hello&nbsp;team,</p><div>Numbers are <b>up</b>.</div>"
+              "<script>alert(1)</script><blockquote>old thread</blockquote></body></html>")
+    assert extract_body(part("text/html", markup)) == "Hello team,\nNumbers are up ."
+
+
+def test_decode_reads_only_the_requested_prefix():
+    data = b64("x" * 1000 + "é" * 1000)
+    assert decode_prefix(data, 10) == "x" * 10
+    # A cut inside a multi-byte character drops it instead of failing
+    assert decode_prefix(data, 1001) == "x" * 1000
+    assert decode_prefix(data) == "x" * 1000 + "é" * 1000
+
+
+def test_body_is_limited_to_max_chars():
+    words = " ".join(["word"] * 10000)
+    body = extract_body(part("text/plain", words), max_chars=100)
+    assert 50 <= len(body) <= 100
+    assert words.startswith(body)
+
+
+def test_part_walk_is_bounded():
+    payload = multipart(*[part("text/html", f"<p>{i}</p>") for i in range(MAX_PARTS * 2)])
+    assert len(list(iter_parts(payload))) < MAX_PARTS
+
+
+@pytest.mark.parametrize("quoted", [
+    "On Mon, Jan 1, 2024 at 9:00 AM Ann <ann@example.com> wrote:\n> Old text",
+    "On Mon, Jan 1, 2024 at 9:00 AM Some Long Name <\nann@example.com> wrote:\n> Old text",
+    "-----Original Message-----\nFrom: Ann\nOld text",
+    "---------- Forwarded message ---------\nFrom: Ann <ann@example.com>\nOld text",
+    "From: Ann <ann@example.com>\nSent: Monday, January 1, 2024 9:00 AM\nTo: Team\n\nOld text",
+    "From: Ann <ann@example.com>\nDate: Mon, 1 Jan 2024\nSubject: Update\n\nOld text",
+    "__________________________________\nOld text",
+])
+def test_quoted_replies_are_stripped(quoted):
+    assert strip_quotes_and_signature(f"Thanks, sounds good.\n\n{quoted}") == "Thanks, sounds good."
+
+
+def test_signature_is_stripped():
+    assert strip_quotes_and_signature("See you there.\n--\nAnn\nSales") == "See you there."
+    assert strip_quotes_and_signature("See you there.\nSent from my iPhone") == "See you there."
+
+
+def test_from_line_in_the_body_is_kept():
+    text = "From: the finance team, here is the update.\nRevenue grew 12% this quarter.\n\nTo be continued."
+    assert strip_quotes_and_signature(text) == text
+
+
+def test_forward_only_email_keeps_its_text():
+    forward = "---------- Forwarded message ---------\nFrom: Ann\nPlease review the merger terms."
+    assert extract_body(part("text/plain", forward)) == forward
@@ -0,0 +1,102 @@
+import random
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from polling import PollScheduler, QuotaTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def http_error(status, retry_after=None):
+    headers = {"status": str(status)}
+    if retry_after is not None:
+        headers["retry-after"] = str(retry_after)
+    return HttpError(httplib2.Response(headers), b"")
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault("rng", random.Random(0))
+    return PollScheduler(min_interval=5, max_interval=120, backoff=2,
+                         error_interval=1, max_error_interval=300, **kwargs)
+
+
+def test_burst_mode_polls_again_immediately_while_mail_arrives():
+    scheduler = make_scheduler()
+    assert scheduler.on_success(3) == 0
+    assert scheduler.on_success(1) == 0
+
+
+def test_idle_backoff_doubles_up_to_ceiling():
+    scheduler = make_scheduler()
+    delays = [scheduler.on_success(0) for _ in range(8)]
+    assert delays == [5, 10, 20, 40, 80, 120, 120, 120]
+
+
+def test_found_mail_resets_idle_backoff():
+    scheduler = make_scheduler()
+    for _ in range(4):
+        scheduler.on_success(0)
+    assert scheduler.on_success(2) == 0
+    assert scheduler.on_success(0) == 5
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_back_off_within_jitter_bounds(status):
+    scheduler = make_scheduler()
+    for attempt in range(12):
+        ceiling = min(300, 2 ** attempt)
+        delay = scheduler.on_error(http_error(status))
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_jitter_spreads_retries():
+    delays = {make_scheduler(rng=random.Random(seed)).on_error(http_error(503)) for seed in range(20)}
+    assert len(delays) > 1
+
+
+def test_retry_after_is_honoured_on_429():
+    scheduler = make_scheduler()
+    assert scheduler.on_error(http_error(429, retry_after=30)) == 30
+
+
+def test_success_resets_error_backoff():
+    scheduler = make_scheduler()
+    for _ in range(6):
+        scheduler.on_error(http_error(503))
+    scheduler.on_success(1)
+    assert scheduler.on_error(http_error(503)) <= 1
+
+
+@pytest.mark.parametrize("error", [http_error(401), http_error(404), ValueError("bad response")])
+def test_other_errors_keep_idle_cadence(error):
+    scheduler = make_scheduler()
+    assert [scheduler.on_error(error) for _ in range(3)] == [5, 10, 20]
+
+
+def test_quota_delays_next_poll_until_budget_refills():
+    clock = FakeClock()
+    quota = QuotaTracker(units_per_second=250, clock=clock)
+    scheduler = make_scheduler(quota=quota)
+    quota.charge(750)  # 500 units over budget: two seconds to refill
+    assert scheduler.on_success(1) == 2
+    clock.now = 1.5
+    assert scheduler.on_success(1) == pytest.approx(0.5)
+    clock.now = 2
+    assert scheduler.on_success(1) == 0
+
+
+def test_quota_is_tracked_per_account():
+    clock = FakeClock()
+    quota = QuotaTracker(units_per_second=250, clock=clock)
+    quota.charge(500, account="sales")
+    assert quota.wait_time("sales") == 1
+    assert quota.wait_time("support") == 0
+    assert quota.totals() == {"sales": 500}
@@ -0,0 +1,51 @@
+import time
+
+import work_journal
+from work_journal import WorkJournal
+
+
+def email(msg_id):
+    return {"id": msg_id, "sender_email": f"{msg_id}@example.com", "subject": "Hi", "content": f"Body {msg_id}"}
+
+
+def test_unfinished_resumes_every_message_at_its_stage(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = WorkJournal(path)
+    assert journal.record_fetched([email(i) for i in ("a", "b", "c", "d", "e")]) == \
+        [email(i) for i in ("a", "b", "c", "d", "e")]
+    for msg_id in ("b", "c", "d", "e"):
+        journal.record_classified(msg_id, "Merger", 0.93)
+    for msg_id in ("c", "d", "e"):
+        journal.record_generated(msg_id, {"subject": "Re: Hi", "body": f"Reply {msg_id}"})
+    for msg_id in ("d", "e"):
+        journal.record_sent(msg_id, sent_id=f"sent-{msg_id}")
+    journal.record_acknowledged(["e"])
+    journal.close()
+
+    # A restart after a crash picks everything up from the file
+    journal = WorkJournal(path)
+    assert journal.unfinished() == {
+        "classify": [email("a")],
+        "generate": [(email("b"), ("Merger", 0.93))],
+        "send": [(email("c"), {"subject": "Re: Hi", "body": "Reply c"})],
+        "acknowledge": ["d"],
+    }
+    assert journal.backlog() == {"fetched": 1, "classified": 1, "generated": 1, "sent": 1, "acknowledged": 1}
+    # Refetched messages are not journaled (or processed) twice
+    assert journal.record_fetched([email("a"), email("f")]) == [email("f")]
+    journal.close()
+
+
+def test_prune_deletes_only_old_acknowledged_messages(tmp_path, monkeypatch):
+    journal = WorkJournal(str(tmp_path / "journal.sqlite"))
+    journal.record_fetched([email("a"), email("b")])
+    journal.record_sent("a")
+    journal.record_acknowledged(["a"])
+
+    assert journal.prune(older_than_seconds=3600) == 0
+    now = time.time()
+    monkeypatch.setattr(work_journal.time, "time", lambda: now + 7200)
+    assert journal.prune(older_than_seconds=3600) == 1
+    assert journal.state("a") is None
+    assert journal.state("b") == "fetched"
+    journal.close()
@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Every message moves forward through these states, in this order
+FETCHED = "fetched"
+CLASSIFIED = "classified"
+GENERATED = "generated"
+SENT = "sent"
+ACKNOWLEDGED = "acknowledged"
+STATES = (FETCHED, CLASSIFIED, GENERATED, SENT, ACKNOWLEDGED)
+
+
+class WorkJournal:
+    """
+    Durable record of every message's progress, kept in a WAL-mode SQLite file.
+
+    Each message is written once when fetched and then moves through
+    fetched -> classified -> generated -> sent -> acknowledged (marked read). After a
+    crash, unfinished() tells the service where to pick every message up again:
+    replies already generated are sent without running the models again, and
+    messages already sent are only marked read, so nobody is answered twice.
+    (A crash in the moment between Gmail accepting a send and the journal recording
+    it can still repeat that one reply.)
+
+    Fetched emails are stored with their content, so fetching can run ahead of
+    processing without losing work.
+    """
+    def __init__(self, db_path: str = "work_journal.sqlite"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL lets readers (e.g. backlog queries) run while a writer commits; NORMAL sync
+        # is still durable across process crashes in WAL mode
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id TEXT PRIMARY KEY, state TEXT NOT NULL, email TEXT NOT NULL, "
+            "intent TEXT, confidence REAL, reply TEXT, sent_id TEXT, updated_at REAL NOT NULL)"
+        )
+        # Journals written before confidences were stored lack the column
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(messages)")]
+        if "confidence" not in columns:
+            self._db.execute("ALTER TABLE messages ADD COLUMN confidence REAL")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_state ON messages (state, updated_at)")
+        self._db.commit()
+
+    # --- State transitions ---
+    def record_fetched(self, emails: List[dict]) -> List[dict]:
+        """Stores newly fetched emails and returns only those not already in the journal."""
+        new_emails = []
+        with self._lock:
+            for email in emails:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO messages (id, state, email, updated_at) VALUES (?, ?, ?, ?)",
+                    (email["id"], FETCHED, json.dumps(email), time.time())
+                )
+                if cursor.rowcount:
+                    new_emails.append(email)
+            self._db.commit()
+        return new_emails
+
+    def record_classified(self, msg_id: str, intent: Optional[str], confidence: Optional[float] = None) -> None:
+        self._advance(msg_id, CLASSIFIED, intent=intent, confidence=confidence)
+
+    def record_generated(self, msg_id: str, reply: dict) -> None:
+        self._advance(msg_id, GENERATED, reply=json.dumps(reply))
+
+    def record_sent(self, msg_id: str, sent_id: Optional[str] = None) -> None:
+        self._advance(msg_id, SENT, sent_id=sent_id)
+
+    def record_acknowledged(self, msg_ids: List[str]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "UPDATE messages SET state = ?, updated_at = ? WHERE id = ?",
+                [(ACKNOWLEDGED, time.time(), msg_id) for msg_id in msg_ids]
+            )
+            self._db.commit()
+
+    # --- Queries ---
+    def state(self, msg_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT state FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        return row[0] if row else None
+
+    def backlog(self) -> Dict[str, int]:
+        """Number of messages currently in each state."""
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM messages GROUP BY state").fetchall()
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(rows)
+        return counts
+
+    def unfinished(self) -> Dict[str, list]:
+        """
+        Everything not yet acknowledged, oldest first, grouped by where it resumes:
+        'classify': [email], 'generate': [(email, (intent, confidence))], 'send': [(email, reply)],
+        'acknowledge': [message id].
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, state, email, intent, confidence, reply FROM messages WHERE state != ? ORDER BY updated_at",
+                (ACKNOWLEDGED,)
+            ).fetchall()
+
+        resume = {"classify": [], "generate": [], "send": [], "acknowledge": []}
+        for msg_id, state, email, intent, confidence, reply in rows:
+            if state == FETCHED:
+                resume["classify"].append(json.loads(email))
+            elif state == CLASSIFIED:
+                resume["generate"].append((json.loads(email), (intent, confidence)))
+            elif state == GENERATED:
+                resume["send"].append((json.loads(email), json.loads(reply)))
+            else:
+                resume["acknowledge"].append(msg_id)
+        return resume
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Deletes acknowledged messages older than `older_than_seconds`; returns how many."""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM messages WHERE state = ? AND updated_at < ?",
+                (ACKNOWLEDGED, time.time() - older_than_seconds)
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _advance(self, msg_id: str, state: str, **columns):
+        assignments = "".join(f", {column} = ?" for column in columns)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE messages SET state = ?, updated_at = ?{assignments} WHERE id = ?",
+                (state, time.time(), *columns.values(), msg_id)
+            )
+            self._db.commit()